@@ -1,7 +1,20 @@
+import time
+
+# taken before the imports below so the startup time includes them
+STARTED = time.perf_counter()
+
+from dotenv import load_dotenv
+
+# modules read their settings as they are imported, so .env has to come first
+load_dotenv()
+
 from controller.controller import controllerConfig
-from model.model import modelConfig
-from aws.config import AWSConfig
+from controller.scheduler import RefreshScheduler
+from model.model import WARM_START, modelConfig
+from aws.collector import InventoryCollector, ec2_client, parse_targets
+from telemetry.metrics import STARTUP_SECONDS
 from view.view import viewConfig
+from werkzeug.serving import is_running_from_reloader
 import logging
 
 logging.basicConfig(
@@ -9,17 +22,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+STARTUP_SECONDS.set(time.perf_counter() - STARTED, phase="imports")
+
 
 # Initializes app through views
-def create_api():
-    aws_config = AWSConfig()
-    client = aws_config.ec2
-    model = modelConfig(client)
-    controller = controllerConfig(model)
+def create_api(refresh: bool = True):
+    """
+    Build the API over the existing database. Only the process serving
+    requests should refresh; a watcher process such as the reloader's passes
+    refresh=False, so it neither migrates the schema nor refreshes.
+    """
+    # boto3 is imported and AWS clients built only when a refresh runs
+    collector = InventoryCollector(parse_targets(), client_factory=ec2_client)
+    model = modelConfig(collector, migrate=refresh)
+    STARTUP_SECONDS.set(time.perf_counter() - STARTED, phase="database")
+    scheduler = RefreshScheduler(model)
+    controller = controllerConfig(model, scheduler)
     view = viewConfig(controller)
+
+    ready = time.perf_counter() - STARTED
+    STARTUP_SECONDS.set(ready, phase="ready")
+    if not refresh:
+        logger.info(f"Ready in {ready * 1000:.0f}ms without background refresh")
+        return view.app
+
+    # serve the existing database right away; a warm start leaves recent data until it is due
+    delay = scheduler.warm_start_delay() if WARM_START else 0
+    scheduler.start(initial_delay=delay)
+    logger.info(f"Ready to serve in {ready * 1000:.0f}ms, first refresh in {delay:.0f}s")
     return view.app
 
 
 if __name__ == "__main__":
-    app = create_api()
+    # the debug reloader runs this module in a watcher process and again in the
+    # serving child; only the child refreshes
+    app = create_api(refresh=is_running_from_reloader())
     app.run(debug=True)
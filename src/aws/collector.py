@@ -0,0 +1,157 @@
+"""
+Collects EC2 inventory from many (account/role, region) targets concurrently
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from telemetry.metrics import AWS_CALL_ERRORS, AWS_CALL_SECONDS
+from typing import NamedTuple, Optional
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+COLLECT_MAX_WORKERS = int(os.getenv("COLLECT_MAX_WORKERS", "8"))
+COLLECT_QUEUE_SIZE = int(os.getenv("COLLECT_QUEUE_SIZE", "32"))
+# Region collected when no targets are configured
+DEFAULT_REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+
+
+class Target(NamedTuple):
+    """One account/region pair to collect inventory from"""
+
+    region: str
+    role_arn: Optional[str] = None
+    client: Optional[object] = None
+
+    @property
+    def account(self) -> Optional[int]:
+        # arn:aws:iam::<account>:role/<name>
+        if self.role_arn:
+            return int(self.role_arn.split(":")[4])
+        return None
+
+    @property
+    def label(self) -> str:
+        return f"{self.account or 'default'}/{self.region}"
+
+
+def parse_targets() -> list[Target]:
+    """
+    Parse AWS_TARGETS into collection targets. Entries are comma separated and
+    either a region or role_arn@region; defaults to AWS_DEFAULT_REGION.
+    """
+    targets = []
+    for entry in os.getenv("AWS_TARGETS", "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        role_arn, _, region = entry.rpartition("@")
+        targets.append(Target(region=region, role_arn=role_arn or None))
+    return targets or [Target(region=DEFAULT_REGION)]
+
+
+def ec2_client(region_name: str = None, role_arn: str = None):
+    """Client factory for collectors that imports boto3 only once a refresh builds its first client"""
+    from aws.config import AWSConfig
+    return AWSConfig.get_ec2_client(region_name=region_name, role_arn=role_arn)
+
+
+class InventoryCollector:
+    """Fans paginated describe calls out over a bounded thread pool, one client per target"""
+
+    def __init__(self, targets: list[Target], client_factory=None, max_workers: int = COLLECT_MAX_WORKERS):
+        if not targets:
+            raise ValueError("InventoryCollector needs at least one target")
+        self.targets = targets
+        self.client_factory = client_factory
+        self.max_workers = max_workers
+        self.errors: dict[Target, str] = {}
+
+    @classmethod
+    def for_client(cls, client, region: str = DEFAULT_REGION):
+        """Wrap an already built EC2 client as a single-target collector"""
+        return cls([Target(region=region, client=client)])
+
+    def client_for(self, target: Target):
+        """Return the target's own client or the one client_factory keeps for it"""
+        if target.client is not None:
+            return target.client
+        return self.client_factory(region_name=target.region, role_arn=target.role_arn)
+
+    def collect(self, operations: list[tuple[str, str]], page_size: int, targets: list[Target] = None,
+                filters: list[dict] = None):
+        """
+        Yield (target, operation, items) for every page of every operation as
+        pages arrive from the workers. A failing target is logged and recorded
+        in self.errors without stopping the others. targets narrows collection
+        to some of the targets and filters is passed to every describe call.
+        """
+        targets = targets or self.targets
+        arguments = {"Filters": filters} if filters else {}
+        self.errors = {}
+        pages = queue.Queue(maxsize=COLLECT_QUEUE_SIZE)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # give up if the consumer stopped reading so workers never hang
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def worker(target: Target):
+            try:
+                client = self.client_for(target)
+                for operation, result_key in operations:
+                    paginator = client.get_paginator(operation)
+                    results = paginator.paginate(PaginationConfig={"PageSize": page_size}, **arguments)
+                    for page in self._timed_pages(results, operation, target.region):
+                        if stop.is_set():
+                            return
+                        put((target, operation, page.get(result_key, [])))
+            except Exception as e:
+                logger.error(f"Failed to collect inventory from {target.label}: {e}")
+                self.errors[target] = str(e)
+            finally:
+                put(done)
+
+        workers = min(self.max_workers, len(targets))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collector") as pool:
+            for target in targets:
+                pool.submit(worker, target)
+            try:
+                remaining = len(targets)
+                while remaining:
+                    item = pages.get()
+                    if item is done:
+                        remaining -= 1
+                    else:
+                        yield item
+            finally:
+                stop.set()
+
+        logger.info(
+            f"Collected inventory from {len(targets) - len(self.errors)}/{len(targets)} targets"
+        )
+
+    @staticmethod
+    def _timed_pages(pages, operation: str, region: str):
+        """Yield pages, timing each fetch (one API call) but not the time spent consuming it"""
+        pages = iter(pages)
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            except Exception:
+                AWS_CALL_ERRORS.inc(operation=operation, region=region)
+                raise
+            AWS_CALL_SECONDS.observe(time.perf_counter() - started, operation=operation, region=region)
+            yield page
@@ -4,12 +4,20 @@ via LocalStack
 """
 
 import boto3
+import botocore.session
 import ipaddress
+from aws.throttle import ThrottledClient, TokenBucket, bucket_for
 from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from functools import cached_property
+from itertools import islice
 import logging
 import os, random, math
-from typing import Tuple
+import threading
+import time
+from typing import Iterator, Tuple
 
 logger = logging.getLogger(__name__)
 load_dotenv()
@@ -21,6 +29,10 @@ SUBNET_MIN = int(os.getenv("SUBNET_MIN", "2"))
 SUBNET_MAX = int(os.getenv("SUBNET_MAX", "5"))
 UTIL_LOW = float(os.getenv("UTIL_LOW", "0.05"))
 UTIL_HIGH = float(os.getenv("UTIL_HIGH", "0.95"))
+SEED_MAX_WORKERS = int(os.getenv("SEED_MAX_WORKERS", "16"))
+SEED_PROGRESS_INTERVAL = float(os.getenv("SEED_PROGRESS_INTERVAL", "5"))
+# one connection per seeding worker so calls never queue for the pool
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", str(max(SEED_MAX_WORKERS, 10))))
 SEED = os.getenv("RAND_SEED")
 if SEED is not None:
     random.seed(int(SEED))
@@ -34,91 +46,183 @@ class AWSConfig:
         region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"),
         signature_version="v4",
         retries={"max_attempts": 10, "mode": "standard"},
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
     )
+    # EC2 calls are retried by ThrottledClient, which has to see every throttle
+    _ec2_config = _config.merge(Config(retries={"total_max_attempts": 1, "mode": "standard"}))
 
     _endpoint_url = os.getenv("ENDPOINT_URL", "http://localhost:4566")
     _aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID", "test")
     _aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY", "test")
 
-    def __init__(self):
-        """Initialize AWS configuration"""
-        self.ec2 = self.get_ec2_client()
+    # one session and client per (region, role) target, shared by every refresh
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    @cached_property
+    def ec2(self):
+        """Default EC2 client for seeding, built on first use and not rate limited"""
+        return self.get_ec2_client(rate_limited=False)
+
+    @classmethod
+    def get_ec2_client(cls, region_name: str = None, role_arn: str = None, rate_limited: bool = True):
+        """
+        Get the configured EC2 client of a target, optionally assuming a role,
+        rate limited by the bucket shared with every client of its account and
+        region. Each target's client is built once, so its connection pool is
+        reused across refreshes and role credentials are only renewed when
+        they expire.
+        """
+        region_name = region_name or cls._config.region_name
+        key = (region_name, role_arn, rate_limited)
+        # sessions and clients must not be created concurrently
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = cls._clients[key] = cls._build_ec2_client(region_name, role_arn, rate_limited)
+            return client
 
     @classmethod
-    def get_ec2_client(cls):
-        """Get configured EC2 client for LocalStack"""
+    def _build_ec2_client(cls, region_name: str, role_arn: str = None, rate_limited: bool = True):
         logger.info("AWS EC2 Client initializing...")
         try:
-            logger.info("AWS EC2 Client initialized")
-            return boto3.client(
+            client = cls._session(role_arn).client(
                 "ec2",
-                config=cls._config,
+                config=cls._ec2_config,
+                region_name=region_name,
                 endpoint_url=cls._endpoint_url,
-                aws_access_key_id=cls._aws_access_key_id,
-                aws_secret_access_key=cls._aws_secret_access_key,
             )
+            # arn:aws:iam::<account>:role/<name>
+            account = role_arn.split(":")[4] if role_arn else None
+            logger.info("AWS EC2 Client initialized")
+            # a rate of 0 never waits
+            bucket = bucket_for(account, region_name) if rate_limited else TokenBucket(rate=0)
+            return ThrottledClient(client, bucket, region_name)
         except Exception as e:
             logger.error(f"Failed to create EC2 client: {e}")
             raise
 
+    @classmethod
+    def _session(cls, role_arn: str = None) -> boto3.session.Session:
+        """
+        A session of its own, since the default session is not thread-safe,
+        with the configured keys or with a role's credentials that assume the
+        role again shortly before they expire
+        """
+        if not role_arn:
+            return boto3.session.Session(
+                aws_access_key_id=cls._aws_access_key_id,
+                aws_secret_access_key=cls._aws_secret_access_key,
+            )
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=cls.assume_role(role_arn),
+            refresh_using=lambda: cls.assume_role(role_arn),
+            method="sts-assume-role",
+        )
+        botocore_session = botocore.session.get_session()
+        botocore_session._credentials = credentials
+        return boto3.session.Session(botocore_session=botocore_session)
+
+    @classmethod
+    def assume_role(cls, role_arn: str) -> dict:
+        """Get temporary credentials for a role in another account, as botocore refreshes them"""
+        sts = cls._session().client("sts", config=cls._config, endpoint_url=cls._endpoint_url)
+        credentials = sts.assume_role(
+            RoleArn=role_arn, RoleSessionName="vpc-metric-api"
+        )["Credentials"]
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat(),
+        }
+
     def seed_cloud(self, ec2: boto3.client) -> None:
         """Seeds AWS EC2 instance with VPCs of various subnet utilizations"""
         self.check_ranges()
 
-        # Create randoms for VPC and subnet ranges
+        # Draw every random choice up front so RAND_SEED reproduces the same cloud
+        # no matter how the workers interleave
         vpc_count = random.randint(VPC_MIN, VPC_MAX)
-        logger.info(f"Seeding {vpc_count} VPCs...")
-
-        # Create VPCs with subnets
+        plan = []
         for vpc_idx in range(1, vpc_count + 1):
-            logger.info(f"Creating VPC #{vpc_idx}...")
-            try:
-                # Create VPC
-                vpc_cidr = self.random_vpc_cidr()
-                vpc_response = ec2.create_vpc(CidrBlock=vpc_cidr)
-                vpc_id = vpc_response["Vpc"]["VpcId"]
-                self.tag(ec2, vpc_id, f"seed-vpc-{vpc_idx}")
-                logger.info(f"Created VPC #{vpc_idx}: {vpc_id} ({vpc_cidr})")
-
-                # Create security group for this VPC
-                sg_id = self.ensure_sg(ec2, vpc_id, f"seed-sg-{vpc_idx}")
-
-                # Create subnets in this VPC
-                subnet_count = random.randint(SUBNET_MIN, SUBNET_MAX)
-                for subnet_idx in range(1, subnet_count + 1):
-                    logger.info(f"Creating subnet #{subnet_idx} in VPC #{vpc_idx}...")
-                    try:
-                        # Create subnet
-                        subnet_cidr = self.nth_subnet_cidr(vpc_cidr, subnet_idx)
-                        subnet_response = ec2.create_subnet(
-                            VpcId=vpc_id, CidrBlock=subnet_cidr
-                        )
-                        subnet_id = subnet_response["Subnet"]["SubnetId"]
-                        self.tag(ec2, subnet_id, f"seed-subnet-{vpc_idx}-{subnet_idx}")
-
-                        # Fill subnet to random utilization
-                        target_util = random.uniform(UTIL_LOW, UTIL_HIGH)
-                        used, cap, actual_util = self.fill_subnet_to_utilization(
-                            ec2, subnet_id, sg_id, subnet_cidr, target_util
-                        )
-                        logger.info(
-                            f"Created subnet #{subnet_idx}: {subnet_id} ({subnet_cidr}) - {used}/{cap} IPs ({actual_util}%)"
-                        )
-
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to create subnet #{subnet_idx} in VPC #{vpc_idx}: {e}"
-                        )
-                        raise
-
-                logger.info(f"Completed VPC #{vpc_idx} with {subnet_count} subnets")
-
-            except Exception as e:
-                logger.error(f"Failed to create VPC #{vpc_idx}: {e}")
-                raise
-
+            subnet_count = random.randint(SUBNET_MIN, SUBNET_MAX)
+            plan.append({
+                "index": vpc_idx,
+                "cidr": self.random_vpc_cidr(),
+                "subnets": [random.uniform(UTIL_LOW, UTIL_HIGH) for _ in range(subnet_count)],
+            })
+        progress = SeedProgress(vpc_count, sum(len(vpc["subnets"]) for vpc in plan))
+        logger.info(
+            f"Seeding {progress.vpcs_total} VPCs and {progress.subnets_total} subnets "
+            f"with {SEED_MAX_WORKERS} workers..."
+        )
+
+        # Create VPCs with their security groups, then fill every subnet
+        vpcs = self.run_parallel(lambda vpc: self.create_vpc(ec2, vpc, progress), plan)
+        subnets = [
+            (vpc, subnet_idx, target_util)
+            for vpc in vpcs
+            for subnet_idx, target_util in enumerate(vpc["subnets"], start=1)
+        ]
+        self.run_parallel(lambda subnet: self.create_subnet(ec2, *subnet, progress), subnets)
+
+        progress.report(final=True)
         logger.info(f"Cloud seeding completed: {vpc_count} VPCs created")
 
+    def create_vpc(self, ec2: boto3.client, vpc: dict, progress: "SeedProgress") -> dict:
+        """Create one planned VPC and its security group"""
+        vpc_idx = vpc["index"]
+        try:
+            vpc_id = ec2.create_vpc(
+                CidrBlock=vpc["cidr"],
+                TagSpecifications=self.tag_specifications("vpc", f"seed-vpc-{vpc_idx}"),
+            )["Vpc"]["VpcId"]
+            sg_id = self.ensure_sg(ec2, vpc_id, f"seed-sg-{vpc_idx}")
+            logger.debug(f"Created VPC #{vpc_idx}: {vpc_id} ({vpc['cidr']})")
+        except Exception as e:
+            logger.error(f"Failed to create VPC #{vpc_idx}: {e}")
+            raise
+        progress.add(vpcs=1)
+        return {**vpc, "vpc_id": vpc_id, "sg_id": sg_id}
+
+    def create_subnet(
+        self, ec2: boto3.client, vpc: dict, subnet_idx: int, target_util: float, progress: "SeedProgress"
+    ) -> None:
+        """Create one subnet and fill it to its target utilization"""
+        vpc_idx = vpc["index"]
+        try:
+            subnet_cidr = self.nth_subnet_cidr(vpc["cidr"], subnet_idx)
+            subnet_id = ec2.create_subnet(
+                VpcId=vpc["vpc_id"],
+                CidrBlock=subnet_cidr,
+                TagSpecifications=self.tag_specifications("subnet", f"seed-subnet-{vpc_idx}-{subnet_idx}"),
+            )["Subnet"]["SubnetId"]
+            used, cap, actual_util = self.fill_subnet_to_utilization(
+                ec2, subnet_id, vpc["sg_id"], subnet_cidr, target_util, progress
+            )
+            logger.debug(
+                f"Created subnet #{subnet_idx}: {subnet_id} ({subnet_cidr}) - {used}/{cap} IPs ({actual_util}%)"
+            )
+        except Exception as e:
+            logger.error(f"Failed to create subnet #{subnet_idx} in VPC #{vpc_idx}: {e}")
+            raise
+        progress.add(subnets=1)
+
+    def run_parallel(self, function, items: list) -> list:
+        """
+        Apply function to items on a bounded worker pool and return the results
+        in order. The first failure cancels the tasks not yet started and is raised.
+        """
+        pool = ThreadPoolExecutor(max_workers=SEED_MAX_WORKERS, thread_name_prefix="seed")
+        try:
+            futures = [pool.submit(function, item) for item in items]
+            for future in as_completed(futures):
+                future.result()
+            return [future.result() for future in futures]
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
     def check_ranges(self) -> None:
         """
         Checks ranges on VPC/Subnet creation limits and utilization ranges to make
@@ -147,8 +251,9 @@ class AWSConfig:
 
     # Hepers for seeding
 
-    def tag(self, ec2: boto3.client, resource_id: str, name: str) -> None:
-        ec2.create_tags(Resources=[resource_id], Tags=[{"Key": "Name", "Value": name}])
+    def tag_specifications(self, resource_type: str, name: str) -> list[dict]:
+        # Tag at creation time instead of a separate create_tags call
+        return [{"ResourceType": resource_type, "Tags": [{"Key": "Name", "Value": name}]}]
 
     def random_vpc_cidr(self) -> str:
         # 10.X.0.0/16 (overlap is fine for LocalStack demos)
@@ -165,10 +270,13 @@ class AWSConfig:
         # AWS usable IPs per subnet = total - 5 (reserved)
         return max(ipaddress.ip_network(cidr).num_addresses - 5, 0)
 
-    def usable_ips(self, cidr: str) -> list[str]:
-        # Skip first 3 hosts + last host to mimic AWS reserves
-        hosts = list(ipaddress.ip_network(cidr).hosts())
-        return [str(ip) for ip in hosts[3:-1]] if len(hosts) >= 5 else []
+    def usable_ips(self, cidr: str) -> Iterator[str]:
+        # Skip network + first 3 hosts and the broadcast address to mimic AWS reserves,
+        # yielding addresses lazily instead of materializing the whole network
+        net = ipaddress.ip_network(cidr)
+        first, last = int(net.network_address) + 4, int(net.broadcast_address) - 1
+        for address in range(first, last + 1):
+            yield str(ipaddress.IPv4Address(address))
 
     def ensure_sg(self, ec2: boto3.client, vpc_id: str, name: str) -> str:
         sg_id = ec2.create_security_group(
@@ -192,6 +300,7 @@ class AWSConfig:
         sg_id: str,
         cidr: str,
         target_util: float,
+        progress: "SeedProgress" = None,
     ) -> Tuple[int, int, float]:
         cap = self.subnet_capacity(cidr)
         if cap <= 0:
@@ -202,23 +311,54 @@ class AWSConfig:
 
         ips = self.usable_ips(cidr)
         used = 0
-        i = 0
-        while used < target_used and i < len(ips):
-            batch = min(20, target_used - used)  # 1 primary + up to 19 secondary IPs
-            primary = ips[i]
-            secondaries = [
-                {"PrivateIpAddress": ip, "Primary": False}
-                for ip in ips[i + 1 : i + batch]
-            ]
-            eni = ec2.create_network_interface(
+        while used < target_used:
+            # 1 primary + up to 19 secondary IPs
+            batch = list(islice(ips, min(20, target_used - used)))
+            if not batch:
+                break
+            ec2.create_network_interface(
                 SubnetId=subnet_id,
                 Groups=[sg_id],
-                PrivateIpAddress=primary,
-                PrivateIpAddresses=secondaries,
+                PrivateIpAddress=batch[0],
+                PrivateIpAddresses=[{"PrivateIpAddress": ip, "Primary": False} for ip in batch[1:]],
                 Description="seed",
-            )["NetworkInterface"]
-            self.tag(ec2, eni["NetworkInterfaceId"], "seed")
-            used += batch
-            i += batch
+                TagSpecifications=self.tag_specifications("network-interface", "seed"),
+            )
+            used += len(batch)
+            if progress:
+                progress.add(enis=1, ips=len(batch))
 
         return (used, cap, round(100 * used / cap, 2))
+
+
+class SeedProgress:
+    """Thread-safe seeding counters, logged with throughput every SEED_PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, vpcs_total: int, subnets_total: int):
+        self.vpcs_total = vpcs_total
+        self.subnets_total = subnets_total
+        self.counts = {"vpcs": 0, "subnets": 0, "enis": 0, "ips": 0}
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+            due = time.monotonic() - self._last_report >= SEED_PROGRESS_INTERVAL
+            if due:
+                self._last_report = time.monotonic()
+        if due:
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        with self._lock:
+            counts = dict(self.counts)
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        logger.info(
+            f"{'Seeded' if final else 'Seeding'}: "
+            f"{counts['vpcs']}/{self.vpcs_total} VPCs, {counts['subnets']}/{self.subnets_total} subnets, "
+            f"{counts['enis']} ENIs, {counts['ips']} IPs in {elapsed:.1f}s "
+            f"({counts['subnets'] / elapsed:.1f} subnets/s, {counts['ips'] / elapsed:.0f} IPs/s)"
+        )
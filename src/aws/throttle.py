@@ -0,0 +1,200 @@
+"""
+Throttling-aware EC2 client layer. Every call waits on a token bucket shared
+by all clients of one account and region, the unit EC2 rate limits by. The
+bucket's rate adapts to the API: it halves when AWS answers with a throttling
+error and creeps back up with every success, so a multi-account fan-out stays
+close to the ceiling instead of tipping into retry storms.
+"""
+
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from telemetry.metrics import AWS_RATE_LIMIT, AWS_RETRIES, AWS_THROTTLES
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# EC2 refills non-mutating (Describe*) request tokens at 20/s with a bucket of 100;
+# a rate of 0 turns limiting off, e.g. against LocalStack
+AWS_RATE_LIMIT_PER_SECOND = float(os.getenv("AWS_RATE_LIMIT", "20"))
+AWS_RATE_BURST = float(os.getenv("AWS_RATE_BURST", "100"))
+AWS_MAX_RETRIES = int(os.getenv("AWS_MAX_RETRIES", "8"))
+AWS_BACKOFF_BASE = float(os.getenv("AWS_BACKOFF_BASE", "0.1"))
+AWS_BACKOFF_MAX = float(os.getenv("AWS_BACKOFF_MAX", "20"))
+
+# Error codes AWS uses for rate limiting, and for failures worth retrying unchanged
+THROTTLE_CODES = {
+    "RequestLimitExceeded", "Throttling", "ThrottlingException", "TooManyRequestsException", "RequestThrottled",
+}
+TRANSIENT_CODES = {"InternalError", "InternalFailure", "ServiceUnavailable", "Unavailable"}
+# Operations safe to retry on any transient failure. A mutating call is only
+# retried when throttled, as AWS rejected it unexecuted; after a dropped
+# connection or an internal error it may still have happened.
+READ_ONLY_PREFIXES = ("describe_",)
+
+# Share of the ceiling kept after a throttle, regained per success, and the floor
+THROTTLE_DECREASE = 0.5
+SUCCESS_INCREASE = 0.005
+MIN_RATE_SHARE = 0.05
+# Seconds after a decrease during which further throttles are answered by backoff alone
+THROTTLE_COOLDOWN = 1.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket whose refill rate follows additive increase,
+    multiplicative decrease between a floor and the configured ceiling
+    """
+
+    def __init__(self, rate: float = AWS_RATE_LIMIT_PER_SECOND, burst: float = AWS_RATE_BURST, label: str = ""):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.label = label
+        self._updated = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        if self.max_rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self) -> None:
+        """Back off after a throttling error, at most once per THROTTLE_COOLDOWN"""
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # throttles from calls already in flight describe the old rate, not the new one
+            if now - self._last_decrease < THROTTLE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self.rate = max(self.rate * THROTTLE_DECREASE, self.max_rate * MIN_RATE_SHARE)
+            self.tokens = 0
+        AWS_RATE_LIMIT.set(self.rate, bucket=self.label)
+        logger.info(f"Throttled by AWS, {self.label} rate lowered to {self.rate:.1f}/s")
+
+    def succeeded(self) -> None:
+        with self._lock:
+            if self.rate >= self.max_rate:
+                return
+            self.rate = min(self.rate + self.max_rate * SUCCESS_INCREASE, self.max_rate)
+        AWS_RATE_LIMIT.set(self.rate, bucket=self.label)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(account, region: str) -> TokenBucket:
+    """The process-wide bucket of an account and region"""
+    key = (account or "default", region)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(label=f"{key[0]}/{region}")
+            AWS_RATE_LIMIT.set(bucket.rate, bucket=bucket.label)
+        return bucket
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(AWS_BACKOFF_MAX, AWS_BACKOFF_BASE * 2 ** attempt))
+
+
+class ThrottledClient:
+    """
+    Wraps an EC2 client so every API call goes through the account/region
+    bucket. Calls are retried here, not inside botocore: read-only calls on
+    throttling and transient errors, other calls on throttling only. Other
+    attributes pass through to the wrapped client.
+    """
+
+    def __init__(self, client, bucket: TokenBucket, region: str, max_retries: int = AWS_MAX_RETRIES):
+        self._client = client
+        self.bucket = bucket
+        self.region = region
+        self.max_retries = max_retries
+        meta = getattr(client, "meta", None)
+        self._operations = set(meta.method_to_api_mapping) if meta is not None else None
+
+    def call(self, operation: str, **kwargs):
+        method = getattr(self._client, operation)
+        read_only = operation.startswith(READ_ONLY_PREFIXES)
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = method(**kwargs)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code in THROTTLE_CODES:
+                    AWS_THROTTLES.inc(operation=operation, region=self.region)
+                    self.bucket.throttled()
+                elif code not in TRANSIENT_CODES or not read_only:
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+            except (ConnectionError, HTTPClientError):
+                if not read_only or attempt >= self.max_retries:
+                    raise
+            else:
+                self.bucket.succeeded()
+                return response
+            attempt += 1
+            AWS_RETRIES.inc(operation=operation, region=self.region)
+            time.sleep(backoff(attempt))
+
+    def get_paginator(self, operation: str) -> "ThrottledPaginator":
+        return ThrottledPaginator(self, operation)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or (self._operations is not None and name not in self._operations):
+            return attribute
+
+        def call(**kwargs):
+            return self.call(name, **kwargs)
+        return call
+
+
+class ThrottledPaginator:
+    """
+    Pages an EC2 describe call by NextToken, retrying each page on its own
+    so a throttle mid-listing never restarts the listing
+    """
+
+    def __init__(self, client: ThrottledClient, operation: str):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        page_size = (PaginationConfig or {}).get("PageSize")
+        if page_size:
+            kwargs["MaxResults"] = page_size
+        token = None
+        while True:
+            page = self.client.call(self.operation, **kwargs, **({"NextToken": token} if token else {}))
+            yield page
+            token = page.get("NextToken")
+            if not token:
+                return
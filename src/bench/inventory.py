@@ -0,0 +1,210 @@
+"""
+Deterministic synthetic EC2 inventory served through a stub client, so the
+ingest path can be exercised at any scale without AWS or LocalStack
+"""
+
+from botocore.exceptions import ClientError
+import itertools
+import random
+import threading
+import time
+
+# Subnet sizes drawn for synthetic subnets, all /24 aligned inside a VPC /16
+SUBNET_PREFIXES = (24, 25, 26, 27)
+AVAILABILITY_ZONES = ("a", "b", "c")
+RESERVED_IPS = 5
+# describe_* filter names the stub client understands and the item key each matches
+FILTER_KEYS = {"vpc-id": "VpcId", "owner-id": "OwnerId"}
+
+
+class SyntheticInventory:
+    """
+    Generates the VPCs and subnets of one account lazily. The same
+    (seed, account, vpcs, subnets_per_vpc) always yields the same items.
+    """
+
+    def __init__(self, vpcs: int, subnets_per_vpc: int, seed: int = 42, account: int = 111122223333,
+                 region: str = "us-east-1", util_low: float = 0.05, util_high: float = 0.95):
+        if not 0 < subnets_per_vpc <= 256:
+            raise ValueError("subnets_per_vpc must be between 1 and 256")
+        self.vpcs = vpcs
+        self.subnets_per_vpc = subnets_per_vpc
+        self.seed = seed
+        self.account = account
+        self.region = region
+        self.util_low = util_low
+        self.util_high = util_high
+
+    def vpc_id(self, index: int) -> str:
+        return f"vpc-{self.account % 10**6:06d}{index:08x}"
+
+    def iter_vpcs(self):
+        for index in range(self.vpcs):
+            yield {
+                "VpcId": self.vpc_id(index),
+                "OwnerId": str(self.account),
+                "CidrBlock": f"10.{index % 256}.0.0/16",
+                "State": "available",
+                "Tags": [{"Key": "Name", "Value": f"bench-vpc-{index}"}],
+            }
+
+    def iter_subnets(self):
+        for index in range(self.vpcs):
+            for subnet, _ in self._vpc_subnets(index):
+                yield subnet
+
+    def iter_network_interfaces(self):
+        for index in range(self.vpcs):
+            for subnet, interfaces in self._vpc_subnets(index):
+                network = subnet["CidrBlock"].split("/")[0].rsplit(".", 1)[0]
+                for number, offsets in enumerate(interfaces):
+                    yield {
+                        "NetworkInterfaceId": f"eni-{subnet['SubnetId'][7:]}{number:04x}",
+                        "SubnetId": subnet["SubnetId"],
+                        "VpcId": subnet["VpcId"],
+                        "OwnerId": str(self.account),
+                        "PrivateIpAddresses": [
+                            {"PrivateIpAddress": f"{network}.{offset}", "Primary": position == 0}
+                            for position, offset in enumerate(offsets)
+                        ],
+                    }
+
+    def _vpc_subnets(self, index: int):
+        """
+        The subnets of one VPC with the address offsets of their network
+        interfaces: blocks of up to 20 addresses separated by small random gaps
+        """
+        # string seeds hash the same way in every process
+        rng = random.Random(f"{self.seed}:{self.account}:{index}")
+        vpc_id = self.vpc_id(index)
+        subnets = []
+        for position in range(self.subnets_per_vpc):
+            prefix = rng.choice(SUBNET_PREFIXES)
+            size = 2 ** (32 - prefix)
+            target = int((size - RESERVED_IPS) * rng.uniform(self.util_low, self.util_high))
+            interfaces, offset, used = [], 4, 0
+            while used < target:
+                offset += rng.randint(0, 8)
+                block = list(range(offset, min(offset + 20, size - 1, offset + target - used)))
+                if not block:
+                    break
+                interfaces.append(block)
+                used += len(block)
+                offset = block[-1] + 1
+            subnets.append(({
+                "SubnetId": f"subnet-{vpc_id[4:]}{position:02x}",
+                "VpcId": vpc_id,
+                "OwnerId": str(self.account),
+                "CidrBlock": f"10.{index % 256}.{position}.0/{prefix}",
+                "State": "available",
+                "AvailabilityZone": f"{self.region}{AVAILABILITY_ZONES[position % 3]}",
+                "AvailableIpAddressCount": size - RESERVED_IPS - used,
+                "Tags": [{"Key": "Name", "Value": f"bench-subnet-{index}-{position}"}],
+            }, interfaces))
+        return subnets
+
+
+class StubPaginator:
+    """Pages a lazily generated item stream the way a boto3 paginator does"""
+
+    def __init__(self, items, result_key: str):
+        self.items = items
+        self.result_key = result_key
+
+    def paginate(self, PaginationConfig=None, Filters=None):
+        page_size = (PaginationConfig or {}).get("PageSize") or 1000
+        filters = [(FILTER_KEYS[f["Name"]], set(f["Values"])) for f in Filters or ()]
+        page = []
+        for item in self.items():
+            if any(item.get(key) not in values for key, values in filters):
+                continue
+            page.append(item)
+            if len(page) == page_size:
+                yield {self.result_key: page}
+                page = []
+        if page:
+            yield {self.result_key: page}
+
+
+class StubEC2Client:
+    """The slice of the EC2 client the collector uses, backed by a SyntheticInventory"""
+
+    # describe operation -> (inventory generator, response key)
+    OPERATIONS = {
+        "describe_vpcs": ("iter_vpcs", "Vpcs"),
+        "describe_subnets": ("iter_subnets", "Subnets"),
+        "describe_network_interfaces": ("iter_network_interfaces", "NetworkInterfaces"),
+    }
+
+    def __init__(self, inventory: SyntheticInventory):
+        self.inventory = inventory
+        self.calls = 0
+        # listings in progress by NextToken, so a page never regenerates the ones before it
+        self._listings = {}
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get_paginator(self, operation: str) -> StubPaginator:
+        self.calls += 1
+        if operation not in self.OPERATIONS:
+            raise NotImplementedError(f"StubEC2Client does not implement {operation}")
+        items, result_key = self.OPERATIONS[operation]
+        return StubPaginator(getattr(self.inventory, items), result_key)
+
+    def _describe(self, operation: str, MaxResults: int = 1000, NextToken: str = None, Filters=None) -> dict:
+        """One page of a describe call, continued from NextToken the way the EC2 API does"""
+        with self._lock:
+            self.calls += 1
+            listing = self._listings.pop(NextToken) if NextToken else None
+        if listing is None:
+            items, result_key = self.OPERATIONS[operation]
+            pages = StubPaginator(getattr(self.inventory, items), result_key).paginate({"PageSize": MaxResults}, Filters)
+            page = next(pages, {result_key: []})
+        else:
+            pages, page = listing
+        # the page after this one is generated now so the last page carries no NextToken
+        following = next(pages, None)
+        if following is None:
+            return page
+        token = f"{operation}-{next(self._tokens)}"
+        with self._lock:
+            self._listings[token] = (pages, following)
+        return {**page, "NextToken": token}
+
+    def describe_vpcs(self, **kwargs) -> dict:
+        return self._describe("describe_vpcs", **kwargs)
+
+    def describe_subnets(self, **kwargs) -> dict:
+        return self._describe("describe_subnets", **kwargs)
+
+    def describe_network_interfaces(self, **kwargs) -> dict:
+        return self._describe("describe_network_interfaces", **kwargs)
+
+
+class ThrottlingStubClient(StubEC2Client):
+    """
+    A stub client that rate limits itself the way EC2 does: calls beyond a
+    token bucket of burst requests refilled at rate per second fail with
+    RequestLimitExceeded
+    """
+
+    def __init__(self, inventory: SyntheticInventory, rate: float = 20, burst: float = 100):
+        super().__init__(inventory)
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.throttled = 0
+        self._updated = time.monotonic()
+
+    def _describe(self, operation: str, **kwargs) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens < 1:
+                self.throttled += 1
+                raise ClientError(
+                    {"Error": {"Code": "RequestLimitExceeded", "Message": "Request limit exceeded."}}, operation
+                )
+            self.tokens -= 1
+        return super()._describe(operation, **kwargs)
@@ -0,0 +1,247 @@
+"""
+Benchmark ingest, rollup and API latency against a synthetic inventory.
+
+    python -m bench.run --vpcs 10000 --subnets-per-vpc 50 --output bench/baselines/main.json
+    python -m bench.run --vpcs 10000 --subnets-per-vpc 50 --compare bench/baselines/main.json
+
+Results are written as JSON so runs on different commits can be compared.
+"""
+
+from aws.collector import InventoryCollector, Target
+from aws.throttle import AWS_RATE_BURST, ThrottledClient, bucket_for
+from bench.inventory import StubEC2Client, SyntheticInventory, ThrottlingStubClient
+from controller.controller import controllerConfig
+from db.storage import Storage
+from model.model import modelConfig, VPC
+from sqlalchemy import select, update
+from view.cache import ResponseCache
+from view.view import viewConfig
+from datetime import datetime, timezone
+import argparse
+import json
+import logging
+import numpy as np
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Relative slowdown tolerated by --compare before a metric counts as a regression
+BENCH_TOLERANCE = 0.20
+
+
+def build_model(args, database_url: str) -> modelConfig:
+    """A model whose collector serves one synthetic inventory per account"""
+    per_account = max(args.vpcs // args.accounts, 1)
+    targets = []
+    for offset in range(args.accounts):
+        account = 100000000000 + offset
+        inventory = SyntheticInventory(per_account, args.subnets_per_vpc, seed=args.seed, account=account)
+        client = StubEC2Client(inventory)
+        if args.api_rate:
+            # an EC2-like rate limit on the stub, called through the throttling client layer
+            client = ThrottledClient(
+                ThrottlingStubClient(inventory, rate=args.api_rate, burst=AWS_RATE_BURST),
+                bucket_for(account, inventory.region), inventory.region,
+            )
+        targets.append(Target(
+            region=inventory.region,
+            role_arn=f"arn:aws:iam::{account}:role/bench",
+            client=client,
+        ))
+    return modelConfig(InventoryCollector(targets), storage=Storage(database_url))
+
+
+def timed(function, *args):
+    """Run function and return (seconds, result)"""
+    started = time.perf_counter()
+    result = function(*args)
+    return round(time.perf_counter() - started, 4), result
+
+
+def bench_stages(model: modelConfig) -> dict:
+    """Time the refresh pipeline stage by stage"""
+    stages = {}
+    stages["ingest_seconds"], counts = timed(model.seed_db)
+    stages["refresh_unchanged_seconds"], _ = timed(model.seed_db)
+
+    # invalidate the scores so the rollup rewrites every VPC
+    with model.storage.WriteSession() as session:
+        session.execute(update(VPC).values(utilization_score=-1))
+        session.commit()
+    stages["rollup_seconds"], stages["rollup_rescored"] = timed(model.rollup_vpc_utilization)
+
+    def grade():
+        with model.storage.WriteSession() as session:
+            graded = model._materialize_grades(session)
+            session.commit()
+            return graded
+    stages["grade_seconds"], stages["graded_vpcs"] = timed(grade)
+
+    throttled = [getattr(target.client._client, "throttled", 0) for target in model.client.targets
+                 if isinstance(target.client, ThrottledClient)]
+    if throttled:
+        stages["throttled_calls"] = sum(throttled)
+    stages["vpcs"] = counts["vpcs"]["inserted"]
+    stages["subnets"] = counts["subnets"]["inserted"]
+    return stages
+
+
+def latency(client, paths, requests: int, on_response=None) -> dict:
+    """Issue the request paths(index) returns for each index and summarize per-request latency"""
+    samples = []
+    started = time.perf_counter()
+    for index in range(requests):
+        path = paths(index)
+        begin = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        samples.append(time.perf_counter() - begin)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        if on_response:
+            on_response(response)
+    elapsed = time.perf_counter() - started
+    samples = np.array(samples) * 1000
+    return {
+        "requests": requests,
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "mean_ms": round(float(samples.mean()), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+
+
+def bench_api(model: modelConfig, args) -> dict:
+    """Latency and throughput of the read endpoints through the Flask test client"""
+    view = viewConfig(controllerConfig(model))
+    if not args.cached:
+        # a zero-sized cache measures the full build path on every request
+        view.cache = ResponseCache(max_size=0)
+    client = view.app.test_client()
+
+    with model.storage.ReadSession() as session:
+        vpc_ids = list(session.scalars(select(VPC.vpc_id).order_by(VPC.vpc_id)))
+    sample = random.Random(args.seed).choices(vpc_ids, k=args.requests)
+
+    # walk /vpc page by page, starting over after the last page
+    cursor = {"next": None}
+
+    def vpc_pages(index):
+        path = f"/vpc?limit={args.page_size}"
+        if cursor["next"]:
+            path += f"&cursor={cursor['next']}"
+        return path
+
+    def next_page(response):
+        cursor["next"] = response.get_json()["next_cursor"]
+
+    return {
+        "/vpc": latency(client, vpc_pages, args.requests, next_page),
+        "/vpc/<id>": latency(client, lambda index: f"/vpc/{sample[index]}", args.requests),
+        "/vpc/<id>/grade": latency(client, lambda index: f"/vpc/{sample[index]}/grade", args.requests),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print every metric next to the baseline and return the regressed ones"""
+    regressions = []
+    rows = [(f"stages.{name}", value, baseline["stages"].get(name), True)
+            for name, value in results["stages"].items() if name.endswith("_seconds")]
+    for endpoint, metrics in results["endpoints"].items():
+        previous = baseline["endpoints"].get(endpoint, {})
+        for name in ("p50_ms", "p99_ms", "throughput_rps"):
+            rows.append((f"{endpoint} {name}", metrics[name], previous.get(name), name != "throughput_rps"))
+
+    print(f"{'metric':<40}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, current, previous, lower_is_better in rows:
+        if not previous:
+            print(f"{name:<40}{'-':>14}{current:>14.3f}{'':>10}")
+            continue
+        change = (current - previous) / previous
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        flag = "  REGRESSED" if worse else ""
+        print(f"{name:<40}{previous:>14.3f}{current:>14.3f}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ingest, rollup and API latency")
+    parser.add_argument("--vpcs", type=int, default=1000, help="total synthetic VPCs")
+    parser.add_argument("--subnets-per-vpc", type=int, default=10)
+    parser.add_argument("--accounts", type=int, default=1, help="targets collected concurrently")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--page-size", type=int, default=100, help="limit used for /vpc")
+    parser.add_argument("--cached", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--api-rate", type=float, default=0,
+                        help="describe calls per second the stub allows per account before throttling (0 = unlimited)")
+    parser.add_argument("--database-url", help="defaults to a SQLite file in a temporary directory")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    with tempfile.TemporaryDirectory(prefix="vpc-bench-") as directory:
+        model = build_model(args, args.database_url or f"sqlite:///{directory}/bench.db")
+        try:
+            stages = bench_stages(model)
+            endpoints = bench_api(model, args)
+        finally:
+            model.storage.dispose()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "vpcs": args.vpcs,
+            "subnets_per_vpc": args.subnets_per_vpc,
+            "accounts": args.accounts,
+            "seed": args.seed,
+            "cached": args.cached,
+            "api_rate": args.api_rate,
+        },
+        "stages": stages,
+        "endpoints": endpoints,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["meta"].get("vpcs") != args.vpcs or baseline["meta"].get("subnets_per_vpc") != args.subnets_per_vpc:
+            logger.warning("Baseline was recorded at a different scale; comparison is indicative only")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
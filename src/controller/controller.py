@@ -3,26 +3,106 @@ Controller is the component that enables the interconnection between the views a
 the model so it acts as an intermediary
 """
 
-from model.model import modelConfig, VPC, Subnet
-from sqlalchemy.orm import sessionmaker
+from model.model import modelConfig, Grade, RefreshScope, VPC, Subnet, UtilizationTrend
+from model.cidrindex import CIDR_KINDS
+from model.grading import GRADE_BOUNDS, score_to_grade
+from controller.jobs import SUCCEEDED, RefreshJobs
+from controller.scheduler import RefreshScheduler
+from sqlalchemy import and_, or_, select, tuple_
+from datetime import datetime, timezone
+import base64
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Default and largest page returned by GET /vpc
+VPC_PAGE_SIZE = int(os.getenv("VPC_PAGE_SIZE", "100"))
+VPC_PAGE_SIZE_MAX = int(os.getenv("VPC_PAGE_SIZE_MAX", "1000"))
+# Rows fetched per round trip by the subnet export
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+SORT_COLUMNS = {
+    'vpc_id': VPC.vpc_id,
+    'utilization': VPC.utilization_score,
+    'last_updated': VPC.last_updated,
+}
+
+
 class controllerConfig:
-    def __init__(self, model: modelConfig):
+    def __init__(self, model: modelConfig, scheduler: RefreshScheduler = None):
         self.model = model
-        self.Session = sessionmaker(bind=model.engine)
+        self.scheduler = scheduler
+        # refreshes requested here and by the scheduler share one job queue
+        self.jobs = scheduler.jobs if scheduler else RefreshJobs(model)
+        # reads share the model's pooled, query-only engine
+        self.Session = model.storage.ReadSession
+
+    def get_all_vpcs(self, limit=None, cursor=None, account_id=None, state=None, grade=None,
+                     min_utilization=None, max_utilization=None, sort='vpc_id', order='asc'):
+        """
+        Get one page of VPCs with their utilization scores, filtered and sorted
+        in SQL. Returns the page and the cursor of the next one (None when done).
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+        limit = min(int(limit or VPC_PAGE_SIZE), VPC_PAGE_SIZE_MAX)
+        if limit <= 0:
+            raise ValueError("limit must be > 0")
+        account_id = int(account_id) if account_id is not None else None
+        grades = grade.split(',') if grade is not None else None
+        for g in grades or ():
+            if g not in GRADE_BOUNDS:
+                raise ValueError(f"grade must be one of {', '.join(GRADE_BOUNDS)}")
+        min_utilization = float(min_utilization) if min_utilization is not None else None
+        max_utilization = float(max_utilization) if max_utilization is not None else None
+        position = self._decode_cursor(cursor, sort) if cursor else None
+
+        snapshot = self.model.snapshot
+        if snapshot is not None:
+            vpcs, last = snapshot.page_vpcs(
+                limit, position, sort, order, account_id, state, grades, min_utilization, max_utilization
+            )
+            return vpcs, self._encode_cursor(*last, sort) if last is not None else None
+
+        query = select(VPC)
+        if account_id is not None:
+            query = query.where(VPC.account_id == account_id)
+        if state is not None:
+            query = query.where(VPC.state == state)
+        if grades is not None:
+            query = query.where(or_(*[self._grade_range(g) for g in grades]))
+        if min_utilization is not None:
+            query = query.where(VPC.utilization_score >= min_utilization)
+        if max_utilization is not None:
+            query = query.where(VPC.utilization_score <= max_utilization)
+
+        sort_column = SORT_COLUMNS[sort]
+        keyset = tuple_(sort_column, VPC.vpc_id)
+        if position is not None:
+            query = query.where(keyset > position if order == 'asc' else keyset < position)
+        if order == 'asc':
+            query = query.order_by(sort_column.asc(), VPC.vpc_id.asc())
+        else:
+            query = query.order_by(sort_column.desc(), VPC.vpc_id.desc())
 
-    def get_all_vpcs(self):
-        """Get all VPCs with their utilization scores"""
         session = self.Session()
         try:
-            vpcs = session.query(VPC).all()
+            # fetch one extra row to learn whether another page follows
+            vpcs = session.scalars(query.limit(limit + 1)).all()
+            next_cursor = None
+            if len(vpcs) > limit:
+                vpcs = vpcs[:limit]
+                next_cursor = self._encode_cursor(getattr(vpcs[-1], sort_column.key), vpcs[-1].vpc_id, sort)
             result = []
             for vpc in vpcs:
                 result.append({
                     'vpc_id': vpc.vpc_id,
+                    'account_id': vpc.account_id,
+                    'region': vpc.region,
                     'name': vpc.name,
                     'cidr_block': vpc.cidr_block,
                     'state': vpc.state,
@@ -30,7 +110,7 @@ class controllerConfig:
                     'grade': self._score_to_grade(vpc.utilization_score),
                     'last_updated': vpc.last_updated.isoformat() if vpc.last_updated else None
                 })
-            return result
+            return result, next_cursor
         except Exception as e:
             logger.error(f"Failed to get VPCs: {e}")
             raise
@@ -39,16 +119,30 @@ class controllerConfig:
 
     def get_vpc_details(self, vpc_id):
         """Get detailed VPC information including subnets"""
+        snapshot = self.model.snapshot
+        if snapshot is not None:
+            return snapshot.vpc_details(vpc_id)
+
         session = self.Session()
         try:
-            vpc = session.query(VPC).filter(VPC.vpc_id == vpc_id).first()
-            if not vpc:
+            row = session.execute(
+                select(VPC, UtilizationTrend.days_to_exhaustion)
+                .outerjoin(UtilizationTrend, UtilizationTrend.entity_id == VPC.vpc_id)
+                .where(VPC.vpc_id == vpc_id)
+            ).first()
+            if not row:
                 return None
+            vpc, vpc_days = row
                 
-            subnets = session.query(Subnet).filter(Subnet.vpc_id == vpc_id).all()
+            subnets = session.execute(
+                select(Subnet, UtilizationTrend.days_to_exhaustion)
+                .outerjoin(UtilizationTrend, UtilizationTrend.entity_id == Subnet.subnet_id)
+                .where(Subnet.vpc_id == vpc_id)
+                .order_by(Subnet.subnet_id)
+            ).all()
             
             subnet_details = []
-            for subnet in subnets:
+            for subnet, subnet_days in subnets:
                 subnet_details.append({
                     'subnet_id': subnet.subnet_id,
                     'name': subnet.name,
@@ -58,16 +152,24 @@ class controllerConfig:
                     'available_ip_count': subnet.available_ip_count,
                     'total_ip_count': subnet.total_ip_count,
                     'utilization_score': subnet.utilization_score,
-                    'grade': self._score_to_grade(subnet.utilization_score)
+                    'grade': self._score_to_grade(subnet.utilization_score),
+                    'days_to_exhaustion': subnet_days,
+                    'used_ip_count': subnet.used_ip_count,
+                    'largest_free_block': subnet.largest_free_block,
+                    'free_prefix_blocks': subnet.free_prefix_blocks,
+                    'fragmentation_score': subnet.fragmentation_score,
                 })
             
             return {
                 'vpc_id': vpc.vpc_id,
+                'account_id': vpc.account_id,
+                'region': vpc.region,
                 'name': vpc.name,
                 'cidr_block': vpc.cidr_block,
                 'state': vpc.state,
                 'utilization_score': vpc.utilization_score,
                 'grade': self._score_to_grade(vpc.utilization_score),
+                'days_to_exhaustion': vpc_days,
                 'last_updated': vpc.last_updated.isoformat() if vpc.last_updated else None,
                 'subnets': subnet_details
             }
@@ -78,18 +180,23 @@ class controllerConfig:
             session.close()
 
     def grade_vpc(self, vpc_id):
-        """Get grading information for a specific VPC"""
+        """Get grading information for a specific VPC from the grades materialized at refresh"""
+        snapshot = self.model.snapshot
+        if snapshot is not None:
+            grade = snapshot.grade(vpc_id)
+            return self._grade_to_dict(grade) if grade else None
+
         session = self.Session()
         try:
-            vpc = session.query(VPC).filter(VPC.vpc_id == vpc_id).first()
-            if not vpc:
+            row = session.execute(
+                select(*Grade.__table__.columns, VPC.name)
+                .join(VPC, VPC.vpc_id == Grade.vpc_id)
+                .where(Grade.vpc_id == vpc_id)
+            ).first()
+            if not row:
                 return None
                 
-            # Recalculate utilization to ensure it's current
-            current_utilization = self.model.calculate_vpc_utilization(vpc_id)
-            
-            grade_info = self._calculate_grade_breakdown(vpc, current_utilization)
-            return grade_info
+            return self._grade_to_dict(row._mapping)
             
         except Exception as e:
             logger.error(f"Failed to grade VPC {vpc_id}: {e}")
@@ -97,101 +204,267 @@ class controllerConfig:
         finally:
             session.close()
 
-    def refresh_data(self):
-        """Refresh VPC data from AWS"""
+    def get_vpc_history(self, vpc_id, start=None, end=None, step=None):
+        """Get a VPC's utilization history between two times (ISO 8601 or epoch seconds)"""
+        now = int(datetime.now(timezone.utc).timestamp())
+        end = self._parse_time(end) if end else now
+        start = self._parse_time(start) if start else end - 86400
+        if start >= end:
+            raise ValueError("from must be before to")
+        step = int(step) if step else None
+        
+        session = self.Session()
         try:
-            logger.info("Controller initiating data refresh...")
-            self.model.update_db()
-            return {"status": "success", "message": "Data refreshed successfully"}
-        except Exception as e:
-            logger.error(f"Failed to refresh data: {e}")
-            return {"status": "error", "message": str(e)}
+            if session.scalar(select(VPC.id).where(VPC.vpc_id == vpc_id)) is None:
+                return None
+        finally:
+            session.close()
+            
+        resolution, step, points = self.model.get_history(vpc_id, start, end, step)
+        return {
+            'vpc_id': vpc_id,
+            'from': datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            'to': datetime.fromtimestamp(end, timezone.utc).isoformat(),
+            'step': step,
+            'resolution': resolution or 'raw',
+            'points': [
+                {
+                    'timestamp': datetime.fromtimestamp(bucket, timezone.utc).isoformat(),
+                    'average': average,
+                    'minimum': minimum,
+                    'maximum': maximum,
+                }
+                for bucket, average, minimum, maximum in points
+            ]
+        }
 
-    def _score_to_grade(self, score):
-        """Convert utilization score to letter grade"""
-        if score >= 90:
-            return 'A+'
-        elif score >= 80:
-            return 'A'
-        elif score >= 70:
-            return 'B'
-        elif score >= 60:
-            return 'C'
-        elif score >= 50:
-            return 'D'
-        else:
-            return 'F'
+    def get_all_grades(self):
+        """Get the grades of every VPC materialized at refresh, ordered by VPC id"""
+        snapshot = self.model.snapshot
+        if snapshot is not None:
+            return [self._grade_to_dict(snapshot.grades[vpc_id]) for vpc_id in sorted(snapshot.grades)]
 
-    def _calculate_grade_breakdown(self, vpc, utilization_score):
-        """Calculate detailed grading breakdown for a VPC"""
         session = self.Session()
         try:
-            subnets = session.query(Subnet).filter(Subnet.vpc_id == vpc.vpc_id).all()
-            
-            # Grade factors
-            utilization_grade = self._score_to_grade(utilization_score)
-            
-            # Efficiency: penalize if too few or too many subnets
-            subnet_count = len(subnets)
-            efficiency_score = 100
-            if subnet_count < 2:
-                efficiency_score = 50  # Single point of failure
-            elif subnet_count > 10:
-                efficiency_score = 70  # Possibly over-segmented
-                
-            # Cost optimization: lower scores for underutilized resources
-            cost_score = min(utilization_score * 1.2, 100)
-            
-            # Overall grade (weighted average)
-            overall_score = (utilization_score * 0.5 + efficiency_score * 0.3 + cost_score * 0.2)
-            overall_grade = self._score_to_grade(overall_score)
-            
-            return {
-                'vpc_id': vpc.vpc_id,
-                'name': vpc.name,
-                'overall_grade': overall_grade,
-                'overall_score': round(overall_score, 2),
-                'breakdown': {
-                    'utilization': {
-                        'score': utilization_score,
-                        'grade': utilization_grade,
-                        'weight': '50%'
-                    },
-                    'efficiency': {
-                        'score': efficiency_score,
-                        'grade': self._score_to_grade(efficiency_score),
-                        'weight': '30%',
-                        'factors': f'{subnet_count} subnets'
-                    },
-                    'cost_optimization': {
-                        'score': round(cost_score, 2),
-                        'grade': self._score_to_grade(cost_score),
-                        'weight': '20%'
-                    }
-                },
-                'recommendations': self._get_recommendations(utilization_score, efficiency_score, subnet_count)
-            }
+            rows = session.execute(
+                select(*Grade.__table__.columns, VPC.name)
+                .join(VPC, VPC.vpc_id == Grade.vpc_id)
+                .order_by(Grade.vpc_id)
+            )
+            return [self._grade_to_dict(row._mapping) for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to grade VPCs: {e}")
+            raise
         finally:
             session.close()
 
-    def _get_recommendations(self, utilization_score, efficiency_score, subnet_count):
-        """Generate recommendations based on grades"""
-        recommendations = []
-        
-        if utilization_score < 30:
-            recommendations.append("Consider consolidating resources - very low utilization")
-        elif utilization_score > 90:
-            recommendations.append("High utilization - consider adding capacity")
-            
-        if subnet_count < 2:
-            recommendations.append("Add subnets for redundancy and fault tolerance")
-        elif subnet_count > 8:
-            recommendations.append("Consider consolidating subnets to reduce complexity")
-            
-        if efficiency_score < 70:
-            recommendations.append("Review subnet architecture for optimization")
-            
-        if not recommendations:
-            recommendations.append("VPC is well-configured")
-            
-        return recommendations
+    def export_subnets(self, account_id=None):
+        """
+        Stream every subnet with its VPC, VPC grade and exhaustion forecast as
+        dicts, fetched in EXPORT_CHUNK_ROWS chunks from one read transaction so
+        memory stays flat and the export is a consistent snapshot
+        """
+        query = (
+            select(
+                Subnet.subnet_id, Subnet.vpc_id, Subnet.account_id, Subnet.region,
+                Subnet.availability_zone, Subnet.name, Subnet.cidr_block, Subnet.state,
+                Subnet.available_ip_count, Subnet.total_ip_count, Subnet.utilization_score,
+                Subnet.used_ip_count, Subnet.largest_free_block, Subnet.free_prefix_blocks,
+                Subnet.fragmentation_score, UtilizationTrend.days_to_exhaustion,
+                VPC.name.label('vpc_name'), VPC.cidr_block.label('vpc_cidr_block'),
+                VPC.utilization_score.label('vpc_utilization_score'),
+                Grade.overall_score.label('vpc_overall_score'), Grade.overall_grade.label('vpc_overall_grade'),
+            )
+            .join(VPC, VPC.vpc_id == Subnet.vpc_id)
+            .outerjoin(Grade, Grade.vpc_id == Subnet.vpc_id)
+            .outerjoin(UtilizationTrend, UtilizationTrend.entity_id == Subnet.subnet_id)
+            .order_by(Subnet.subnet_id)
+            .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        )
+        if account_id is not None:
+            query = query.where(Subnet.account_id == int(account_id))
+
+        def rows():
+            with self.Session() as session:
+                for row in session.execute(query):
+                    subnet = row._asdict()
+                    subnet['grade'] = self._score_to_grade(subnet['utilization_score'])
+                    yield subnet
+
+        return rows()
+
+    def get_overlaps(self, kind='vpc', limit=None, cursor=None):
+        """
+        One page of overlapping CIDR blocks of a kind from the index built at
+        refresh. Returns the page, the total and the cursor of the next page.
+        """
+        if kind not in CIDR_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(CIDR_KINDS)}")
+        limit = min(int(limit or VPC_PAGE_SIZE), VPC_PAGE_SIZE_MAX)
+        if limit <= 0:
+            raise ValueError("limit must be > 0")
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            raise ValueError("invalid cursor")
+        if offset < 0:
+            raise ValueError("invalid cursor")
+
+        index = self._cidr_index()
+        total = index.overlap_count(kind)
+        overlaps = index.overlaps(kind, offset, limit)
+        next_cursor = str(offset + limit) if offset + limit < total else None
+        return overlaps, total, next_cursor
+
+    def lookup_cidr(self, ip):
+        """VPCs and subnets whose CIDR block holds an IPv4 address"""
+        if not ip:
+            raise ValueError("ip is required")
+        return self._cidr_index().lookup(ip)
+
+    def _cidr_index(self):
+        # a warm start builds the index in the background; wait for it rather than build another
+        self.model.read_models_loaded.wait()
+        index = self.model.cidr_index or self.model.refresh_cidr_index()
+        if index is None:
+            raise RuntimeError("CIDR index is not available")
+        return index
+
+    def refresh_data(self, account_id=None, vpc_id=None):
+        """Refresh VPC data from AWS and wait for it, joining a refresh already in flight"""
+        logger.info("Controller initiating data refresh...")
+        job, _ = self.jobs.submit(self._refresh_scope(account_id, vpc_id))
+        job.wait()
+        if job.status == SUCCEEDED:
+            return {"status": "success", "message": "Data refreshed successfully", "changes": job.changes}
+        return {"status": "error", "message": job.error}
+
+    def start_refresh(self, account_id=None, vpc_id=None):
+        """
+        Start a refresh job for everything, one account or one VPC without
+        waiting for it. Returns the job and whether it was newly started
+        rather than joined.
+        """
+        job, created = self.jobs.submit(self._refresh_scope(account_id, vpc_id))
+        return job.to_dict(), created
+
+    def refresh_job(self, job_id):
+        """Progress and outcome of a refresh job, or None"""
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    @staticmethod
+    def _refresh_scope(account_id=None, vpc_id=None):
+        try:
+            account_id = int(account_id) if account_id not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError("account_id must be an integer")
+        return RefreshScope(account_id=account_id, vpc_id=vpc_id or None)
+
+    def refresh_status(self):
+        """Report the background refresh state, active jobs and the published data generation"""
+        status = self.scheduler.state() if self.scheduler else {}
+        status['jobs'] = [job.id for job in self.jobs.active()]
+        status['generation'] = self.model.current_generation()
+        return status
+
+    def data_version(self):
+        """Return (generation, published_at) identifying the data every read is served from"""
+        snapshot = self.model.snapshot
+        if snapshot is not None:
+            return snapshot.generation, snapshot.published_at
+        return self.model.current_version()
+
+    def cidr_version(self):
+        """
+        Return (generation, published_at) of the CIDR index overlaps and
+        lookups are served from; it is rebuilt after a generation is published,
+        so it can trail data_version
+        """
+        index = self._cidr_index()
+        return index.generation, index.published_at
+
+    @staticmethod
+    def _grade_range(grade):
+        """SQL condition selecting VPCs whose utilization maps to a letter grade"""
+        low, high = GRADE_BOUNDS[grade]
+        condition = VPC.utilization_score >= low if low is not None else VPC.utilization_score.is_not(None)
+        if high is not None:
+            condition = and_(condition, VPC.utilization_score < high)
+        return condition
+
+    @staticmethod
+    def _parse_time(value):
+        """Epoch seconds from an ISO 8601 timestamp or an epoch number"""
+        try:
+            return int(float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"invalid time: {value}")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+    @staticmethod
+    def _encode_cursor(value, vpc_id, sort):
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return base64.urlsafe_b64encode(json.dumps([value, vpc_id]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor, sort):
+        try:
+            value, vpc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if sort == 'last_updated':
+                value = datetime.fromisoformat(value)
+        except Exception:
+            raise ValueError("invalid cursor")
+        # a cursor from another sort would compare values of different types
+        if sort == 'utilization':
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, (str, datetime))
+        if not valid or not isinstance(vpc_id, str):
+            raise ValueError(f"invalid cursor for sort={sort}")
+        return (value, vpc_id)
+
+    def _score_to_grade(self, score):
+        """Convert utilization score to letter grade"""
+        return score_to_grade(score)
+
+    def _grade_to_dict(self, grade):
+        """Shape a graded VPC as the grading breakdown response"""
+        return {
+            'vpc_id': grade['vpc_id'],
+            'name': grade['name'],
+            'overall_grade': grade['overall_grade'],
+            'overall_score': grade['overall_score'],
+            'days_to_exhaustion': grade['days_to_exhaustion'],
+            'breakdown': {
+                'utilization': {
+                    'score': grade['utilization_score'],
+                    'grade': grade['utilization_grade'],
+                    'weight': '50%'
+                },
+                'efficiency': {
+                    'score': grade['efficiency_score'],
+                    'grade': grade['efficiency_grade'],
+                    'weight': '30%',
+                    'factors': f"{grade['subnet_count']} subnets"
+                },
+                'cost_optimization': {
+                    'score': grade['cost_score'],
+                    'grade': grade['cost_grade'],
+                    'weight': '20%'
+                }
+            },
+            'ip_space': {
+                'fragmentation_score': grade['fragmentation_score'],
+                'largest_free_block': grade['largest_free_block'],
+                'subnets_without_free_prefix': grade['subnets_without_free_prefix'],
+            },
+            'recommendations': grade['recommendations']
+        }
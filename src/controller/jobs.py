@@ -0,0 +1,134 @@
+"""
+Single-flight refresh jobs. Every refresh, whether requested over the API or
+started by the scheduler, runs as a job on one worker thread; a request whose
+scope is already covered by a queued or running job joins that job instead of
+starting another AWS scan.
+"""
+
+from model.model import RefreshScope
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for GET /refresh/<job_id>
+REFRESH_JOB_HISTORY = int(os.getenv("REFRESH_JOB_HISTORY", "100"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class RefreshJob:
+    """One refresh of a scope, with its progress and outcome"""
+
+    def __init__(self, scope: RefreshScope):
+        self.id = uuid.uuid4().hex
+        self.scope = scope
+        self.status = QUEUED
+        self.stage = None
+        self.staged = {}
+        self.requests = 1
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.duration = None
+        self.changes = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def progress(self, stage: str, staged: dict = None) -> None:
+        self.stage = stage
+        if staged is not None:
+            self.staged = dict(staged)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the job finishes; returns whether it did"""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "scope": {"account_id": self.scope.account_id, "vpc_id": self.scope.vpc_id},
+            "status": self.status,
+            "stage": self.stage,
+            "staged": self.staged,
+            "requests": self.requests,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "duration": self.duration,
+            "changes": self.changes,
+            "error": self.error,
+        }
+
+
+class RefreshJobs:
+    """Queues refresh jobs one at a time and coalesces requests onto covering jobs"""
+
+    def __init__(self, model, history: int = REFRESH_JOB_HISTORY):
+        self.model = model
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refresh")
+
+    def submit(self, scope: RefreshScope = None) -> tuple[RefreshJob, bool]:
+        """Return the job refreshing scope and whether it was newly created"""
+        scope = scope or RefreshScope()
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.active and job.scope.covers(scope):
+                    job.requests += 1
+                    logger.info(f"Refresh of {scope} joined job {job.id}")
+                    return job, False
+            job = RefreshJob(scope)
+            self._jobs[job.id] = job
+            self._expire()
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued refresh job {job.id} for {scope}")
+        return job, True
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self) -> list[RefreshJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job.active]
+
+    def _expire(self) -> None:
+        """Drop the oldest finished jobs beyond the history size"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(self._jobs) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: RefreshJob) -> None:
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        started = time.monotonic()
+        status = FAILED
+        try:
+            job.changes = self.model.update_db(job.scope, job.progress)
+            status = SUCCEEDED
+        except Exception as e:
+            logger.error(f"Refresh job {job.id} failed: {e}")
+            job.error = str(e)
+        finally:
+            job.duration = round(time.monotonic() - started, 3)
+            job.finished_at = datetime.utcnow()
+            job.stage = None
+            # the status flips last so a finished job is always complete
+            job.status = status
+            job._done.set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,105 @@
+"""
+Runs model refreshes in the background so the API can serve the existing
+database while fresh AWS data is collected
+"""
+
+from controller.jobs import SUCCEEDED, RefreshJobs
+from datetime import datetime
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "300"))
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "30"))
+
+
+class RefreshScheduler:
+    """
+    Periodically submits a full refresh job on a daemon thread. Jobs are
+    shared with API-requested refreshes, so the two never run side by side.
+    """
+
+    def __init__(self, model, interval: float = REFRESH_INTERVAL, jitter: float = REFRESH_JITTER,
+                 jobs: RefreshJobs = None):
+        self.model = model
+        self.interval = interval
+        self.jitter = jitter
+        self.jobs = jobs or RefreshJobs(model)
+        self._stop = threading.Event()
+        self._thread = None
+        self.running = False
+        self.last_started = None
+        self.last_success = None
+        self.last_error = None
+        self.last_error_at = None
+        self.last_duration = None
+        self.last_changes = None
+
+    def start(self, initial_delay: float = 0) -> None:
+        """Start the refresh loop; the first refresh runs after initial_delay seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(initial_delay,), name="refresh-scheduler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Refresh scheduler started (interval {self.interval}s, jitter {self.jitter}s)")
+
+    def warm_start_delay(self) -> float:
+        """Seconds until the last refresh is one interval old, 0 when nothing was published yet"""
+        refreshed_at = self.model.last_refreshed()
+        if refreshed_at is None:
+            return 0
+        age = (datetime.utcnow() - refreshed_at).total_seconds()
+        return min(max(self.interval - age, 0), self.interval)
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the loop after the current refresh finishes"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self) -> bool:
+        """Refresh now unless a full refresh is already queued or running; returns whether one ran"""
+        job, created = self.jobs.submit()
+        if not created:
+            logger.info("Refresh already in progress, skipping")
+            return False
+        self.running = True
+        self.last_started = datetime.utcnow()
+        try:
+            job.wait()
+        finally:
+            self.running = False
+        self.last_duration = job.duration
+        if job.status == SUCCEEDED:
+            self.last_changes = job.changes
+            self.last_success = job.finished_at
+        else:
+            logger.error(f"Background refresh failed: {job.error}")
+            self.last_error = job.error
+            self.last_error_at = job.finished_at
+        return True
+
+    def state(self) -> dict:
+        """Report the last success/error of the background refresh"""
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "last_success": self.last_success.isoformat() if self.last_success else None,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at.isoformat() if self.last_error_at else None,
+            "last_duration": self.last_duration,
+            "last_changes": self.last_changes,
+        }
+
+    def _run(self, initial_delay: float) -> None:
+        delay = initial_delay
+        while not self._stop.wait(delay):
+            self.run_once()
+            delay = max(self.interval + random.uniform(-self.jitter, self.jitter), 0)
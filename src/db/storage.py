@@ -0,0 +1,86 @@
+"""
+Storage layer shared by the model and controller: configurable database URL,
+connection pooling, SQLite pragmas and separate read and write engines
+"""
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from telemetry.metrics import instrument_engine
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///db/model.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "8"))
+
+# Applied to every SQLite connection; WAL lets readers run alongside the refresh writer
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative is KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),  # milliseconds
+    "foreign_keys": "OFF",
+}
+
+
+class Storage:
+    """Owns the read and write engines and the session factories bound to them"""
+
+    def __init__(self, url: str = DATABASE_URL):
+        self.url = url
+        self.is_sqlite = url.startswith("sqlite")
+
+        if self.is_sqlite and self._in_memory(url):
+            # separate engines would each get their own empty database
+            self.write_engine = create_engine(
+                url, poolclass=StaticPool, connect_args={"check_same_thread": False}
+            )
+            self.read_engine = self.write_engine
+            self._configure_sqlite(self.write_engine, read_only=False)
+            instrument_engine(self.write_engine)
+        else:
+            # one pooled writer serializes refreshes; readers get their own pool
+            self.write_engine = create_engine(url, pool_size=1, max_overflow=0)
+            self.read_engine = create_engine(
+                url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+            )
+            if self.is_sqlite:
+                self._configure_sqlite(self.write_engine, read_only=False)
+                self._configure_sqlite(self.read_engine, read_only=True)
+            instrument_engine(self.write_engine)
+            instrument_engine(self.read_engine)
+
+        self.WriteSession = sessionmaker(bind=self.write_engine)
+        self.ReadSession = sessionmaker(bind=self.read_engine)
+        logger.info(f"Storage configured for {self.write_engine.url.render_as_string()}")
+
+    @staticmethod
+    def _in_memory(url: str) -> bool:
+        return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+    @staticmethod
+    def _configure_sqlite(engine, read_only: bool) -> None:
+        """Apply pragmas and let SQLAlchemy issue BEGIN so transactions are real SQLite ones"""
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+
+        @event.listens_for(engine, "begin")
+        def _on_begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+    def dispose(self) -> None:
+        self.write_engine.dispose()
+        if self.read_engine is not self.write_engine:
+            self.read_engine.dispose()
@@ -0,0 +1,96 @@
+"""
+Address-space index over every VPC and subnet CIDR block, rebuilt at refresh.
+Blocks are integer ranges sorted by start, so the blocks overlapping each one
+are a contiguous run found by binary search: all conflicts come out of one
+O(n log n + conflicts) pass and an address lookup is a bisect plus a walk up
+the chain of enclosing blocks.
+"""
+
+from model.ipspace import parse_cidrs
+import ipaddress
+import numpy as np
+
+# Kinds of blocks indexed and the resource id each is reported under
+CIDR_KINDS = {"vpc": "vpc_id", "subnet": "subnet_id"}
+
+
+class _Ranges:
+    """CIDR blocks of one kind as [start, end] ranges sorted by start, then widest first"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        starts, sizes = parse_cidrs([row["cidr_block"] for row in rows])
+        ends = starts + sizes - 1
+        order = np.lexsort((-ends, starts))
+        self.order = order
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.parents = self._parents(self.starts.tolist(), self.ends.tolist())
+
+        # block i overlaps the blocks after it up to the last one starting at or before its end;
+        # pairs are numbered through the running total instead of being materialized
+        stops = np.searchsorted(self.starts, self.ends, side="right")
+        self.counts = stops - np.arange(len(order)) - 1
+        self.totals = np.cumsum(self.counts)
+        self.total = int(self.totals[-1]) if len(order) else 0
+
+    @staticmethod
+    def _parents(starts, ends):
+        """Nearest preceding block that encloses each block, or -1; CIDRs nest or are disjoint"""
+        parents = [-1] * len(starts)
+        stack = []
+        for index, (start, end) in enumerate(zip(starts, ends)):
+            while stack and ends[stack[-1]] < start:
+                stack.pop()
+            if stack:
+                parents[index] = stack[-1]
+            stack.append(index)
+        return parents
+
+    def containing(self, address: int) -> list:
+        """Rows whose block holds address, most specific first"""
+        index = int(np.searchsorted(self.starts, address, side="right")) - 1
+        rows = []
+        while index >= 0:
+            if self.ends[index] >= address:
+                rows.append(self.rows[self.order[index]])
+            index = self.parents[index]
+        return rows
+
+    def pairs(self, start: int, stop: int) -> list[tuple]:
+        """Rows of overlaps start..stop-1; the second block of each lies inside the first"""
+        positions = np.arange(start, min(stop, self.total))
+        first = np.searchsorted(self.totals, positions, side="right")
+        second = first + 1 + positions - (self.totals[first] - self.counts[first])
+        return [
+            (self.rows[outer], self.rows[inner])
+            for outer, inner in zip(self.order[first].tolist(), self.order[second].tolist())
+        ]
+
+
+class CidrIndex:
+    """Overlapping VPC and subnet CIDR blocks and address lookups for one published generation"""
+
+    def __init__(self, generation: int, published_at, vpc_rows: list[dict], subnet_rows: list[dict]):
+        self.generation = generation
+        self.published_at = published_at
+        self.ranges = {"vpc": _Ranges(vpc_rows), "subnet": _Ranges(subnet_rows)}
+
+    def overlap_count(self, kind: str) -> int:
+        return self.ranges[kind].total
+
+    def overlaps(self, kind: str, offset: int, limit: int) -> list[dict]:
+        """Overlapping pairs of blocks of one kind, ordered by address"""
+        return [
+            {'kind': kind, 'overlap': inner['cidr_block'], 'resources': [outer, inner]}
+            for outer, inner in self.ranges[kind].pairs(offset, offset + limit)
+        ]
+
+    def lookup(self, ip: str) -> dict:
+        """VPCs and subnets whose CIDR block holds ip, most specific first"""
+        address = int(ipaddress.IPv4Address(ip))
+        return {
+            'ip': ip,
+            'vpcs': self.ranges["vpc"].containing(address),
+            'subnets': self.ranges["subnet"].containing(address),
+        }
@@ -0,0 +1,70 @@
+"""
+Online IP-exhaustion forecasting. Every subnet and VPC keeps an exponentially
+weighted linear regression of utilization over time in a handful of running
+moments, so a new sample updates it in constant time without revisiting history.
+"""
+
+import numpy as np
+import os
+
+# Older samples count half as much every half-life
+FORECAST_HALF_LIFE_DAYS = float(os.getenv("FORECAST_HALF_LIFE_DAYS", "14"))
+# Minimum seconds between samples fed into an entity's trend
+FORECAST_SAMPLE_INTERVAL = int(os.getenv("FORECAST_SAMPLE_INTERVAL", "3600"))
+# Recommend action when exhaustion is projected within this many days
+FORECAST_WARNING_DAYS = float(os.getenv("FORECAST_WARNING_DAYS", "30"))
+# Samples needed before a trend is trusted
+FORECAST_MIN_SAMPLES = 3
+
+# Running state of one trend, stored per entity
+TREND_COLUMNS = ("origin", "last_ts", "samples", "weight", "mean_t", "mean_y", "c_tt", "c_ty")
+
+
+def update_trends(state: dict, ts: int, values):
+    """
+    Fold one sample per entity, taken at ts with utilization values (percent),
+    into arrays of trend state. Entities with samples == 0 start a new trend.
+    Returns the new state plus slope (percent per day) and days_to_exhaustion
+    (NaN when utilization is not growing).
+    """
+    values = np.asarray(values, dtype=float)
+    samples = np.asarray(state["samples"], dtype=int)
+    new = samples == 0
+    origin = np.where(new, ts, state["origin"])
+    last_ts = np.where(new, ts, state["last_ts"])
+
+    # time in days since the entity was first seen keeps the moments well conditioned
+    t = (ts - origin) / 86400
+    elapsed = (ts - last_ts) / 86400
+    decay = np.where(new, 0.0, 0.5 ** (elapsed / FORECAST_HALF_LIFE_DAYS))
+
+    weight = np.where(new, 0.0, state["weight"]) * decay + 1
+    mean_t = np.where(new, 0.0, state["mean_t"])
+    mean_y = np.where(new, 0.0, state["mean_y"])
+    dt = t - mean_t
+    dy = values - mean_y
+    mean_t = mean_t + dt / weight
+    mean_y = mean_y + dy / weight
+    c_tt = np.where(new, 0.0, state["c_tt"]) * decay + dt * (t - mean_t)
+    c_ty = np.where(new, 0.0, state["c_ty"]) * decay + dt * (values - mean_y)
+    samples = samples + 1
+
+    trusted = (samples >= FORECAST_MIN_SAMPLES) & (c_tt > 1e-9)
+    slope = np.divide(c_ty, c_tt, out=np.zeros_like(c_ty), where=trusted)
+    fitted = mean_y + slope * (t - mean_t)
+    growing = trusted & (slope > 1e-6)
+    days_to_exhaustion = np.full(len(values), np.nan)
+    days_to_exhaustion[growing] = np.maximum((100 - fitted[growing]) / slope[growing], 0)
+
+    return {
+        "origin": origin,
+        "last_ts": np.full(len(values), ts),
+        "samples": samples,
+        "weight": weight,
+        "mean_t": mean_t,
+        "mean_y": mean_y,
+        "c_tt": c_tt,
+        "c_ty": c_ty,
+        "slope": np.round(slope, 4),
+        "days_to_exhaustion": np.round(days_to_exhaustion, 1),
+    }
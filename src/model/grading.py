@@ -0,0 +1,234 @@
+"""
+Grading rules that turn VPC utilization and layout into scores, letter grades
+and recommendations
+"""
+
+from model.forecast import FORECAST_WARNING_DAYS
+from model.ipspace import PREFIX_BLOCK, RESERVED_IPS
+import numpy as np
+
+# Utilization range [low, high) of each letter grade, matching score_to_grade
+GRADE_BOUNDS = {
+    "A+": (90, None),
+    "A": (80, 90),
+    "B": (70, 80),
+    "C": (60, 70),
+    "D": (50, 60),
+    "F": (None, 50),
+}
+
+# Lower score bound of every grade above F, and the grades they open, for searchsorted
+GRADE_CUTS = np.array([50, 60, 70, 80, 90])
+GRADE_LABELS = np.array(["F", "D", "C", "B", "A", "A+"], dtype=object)
+
+# Per-VPC columns produced by grade_vpcs alongside vpc_id and recommendations
+GRADE_COLUMNS = (
+    "utilization_score",
+    "utilization_grade",
+    "efficiency_score",
+    "efficiency_grade",
+    "cost_score",
+    "cost_grade",
+    "overall_score",
+    "overall_grade",
+    "subnet_count",
+)
+
+# Per-VPC address-space columns, NaN where no subnet was analyzed
+IP_SPACE_GRADE_COLUMNS = ("fragmentation_score", "largest_free_block", "subnets_without_free_prefix")
+
+
+def score_to_grade(score):
+    """Convert utilization score to letter grade"""
+    if score >= 90:
+        return "A+"
+    elif score >= 80:
+        return "A"
+    elif score >= 70:
+        return "B"
+    elif score >= 60:
+        return "C"
+    elif score >= 50:
+        return "D"
+    else:
+        return "F"
+
+
+def recommendations(utilization_score, efficiency_score, subnet_count):
+    """Generate recommendations based on grades"""
+    recommendations = []
+
+    if utilization_score < 30:
+        recommendations.append("Consider consolidating resources - very low utilization")
+    elif utilization_score > 90:
+        recommendations.append("High utilization - consider adding capacity")
+
+    if subnet_count < 2:
+        recommendations.append("Add subnets for redundancy and fault tolerance")
+    elif subnet_count > 8:
+        recommendations.append("Consider consolidating subnets to reduce complexity")
+
+    if efficiency_score < 70:
+        recommendations.append("Review subnet architecture for optimization")
+
+    if not recommendations:
+        recommendations.append("VPC is well-configured")
+
+    return recommendations
+
+
+def scores_to_grades(scores):
+    """Vectorized score_to_grade over an array of scores"""
+    return GRADE_LABELS[np.searchsorted(GRADE_CUTS, scores, side="right")]
+
+
+def grade_vpcs(vpc_ids, total_ip_counts, utilization_scores, subnet_days=None, vpc_days=None, ip_space=None):
+    """
+    Grade every VPC at once: utilization weighted by subnet size, efficiency
+    from the subnet count (fewer than 2 or more than 10 is penalized), cost
+    as 1.2x utilization capped at 100, and a 50/30/20 weighted overall score.
+    Optional per-subnet and per-VPC days to IP exhaustion add forecast warnings,
+    and optional per-subnet ip_space columns (see model.ipspace) add the VPC's
+    fragmentation and prefix-delegation warnings. Takes one entry per subnet,
+    sorted by vpc_id; a VPC without subnets appears once with a None count
+    and score. Returns a dict of per-VPC columns in vpc_id order.
+    """
+    vpc_ids = np.asarray(vpc_ids, dtype=object)
+    if len(vpc_ids) == 0:
+        return {
+            "vpc_id": [],
+            "recommendations": [],
+            "days_to_exhaustion": np.empty(0),
+            **{key: np.empty(0) for key in GRADE_COLUMNS + IP_SPACE_GRADE_COLUMNS},
+        }
+    total = np.array(total_ip_counts, dtype=float)
+    utilization = np.array(utilization_scores, dtype=float)
+    has_subnet = ~np.isnan(total)
+    total = np.where(has_subnet, total, 0)
+    utilization = np.nan_to_num(utilization)
+
+    # group runs of equal vpc_id without sorting again
+    boundaries = np.r_[True, vpc_ids[1:] != vpc_ids[:-1]]
+    starts = np.flatnonzero(boundaries)
+    groups = np.cumsum(boundaries) - 1
+    total_ips = np.bincount(groups, weights=total)
+    weighted = np.bincount(groups, weights=utilization * total)
+    subnet_count = np.bincount(groups, weights=has_subnet).astype(int)
+
+    utilization_score = np.round(np.divide(weighted, total_ips, out=np.zeros_like(weighted), where=total_ips > 0), 2)
+    efficiency_score = np.where(subnet_count < 2, 50, np.where(subnet_count > 10, 70, 100))
+    cost_score = np.minimum(utilization_score * 1.2, 100)
+    overall_score = utilization_score * 0.5 + efficiency_score * 0.3 + cost_score * 0.2
+
+    # exhaustion forecasts, NaN where nothing is trending towards full
+    subnet_days = _as_floats(subnet_days, len(vpc_ids))
+    exhausting = np.bincount(groups, weights=subnet_days < FORECAST_WARNING_DAYS).astype(int)
+    days_to_exhaustion = _as_floats(vpc_days, len(vpc_ids))[starts]
+    ip_space_columns = _ip_space(ip_space, groups, total, len(starts))
+
+    return {
+        "vpc_id": vpc_ids[starts],
+        "utilization_score": utilization_score,
+        "utilization_grade": scores_to_grades(utilization_score),
+        "efficiency_score": efficiency_score,
+        "efficiency_grade": scores_to_grades(efficiency_score),
+        "cost_score": np.round(cost_score, 2),
+        "cost_grade": scores_to_grades(cost_score),
+        "overall_score": np.round(overall_score, 2),
+        "overall_grade": scores_to_grades(overall_score),
+        "subnet_count": subnet_count,
+        "days_to_exhaustion": days_to_exhaustion,
+        **ip_space_columns,
+        "recommendations": _ip_space_recommendations(
+            _forecast_recommendations(
+                _vectorized_recommendations(utilization_score, efficiency_score, subnet_count),
+                days_to_exhaustion,
+                exhausting,
+            ),
+            ip_space_columns["subnets_without_free_prefix"],
+        ),
+    }
+
+
+def _as_floats(values, length):
+    """Float array with None as NaN"""
+    if values is None:
+        return np.full(length, np.nan)
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+def _ip_space(ip_space, groups, total, vpc_count):
+    """
+    Roll subnet address-space analysis up to VPCs: free-address weighted
+    fragmentation, the largest free block of any subnet, and the number of
+    subnets with room for a /28 in total but no free aligned /28 block
+    """
+    if ip_space is None:
+        return {column: np.full(vpc_count, np.nan) for column in IP_SPACE_GRADE_COLUMNS}
+    used = _as_floats(ip_space["used_ip_count"], len(total))
+    analyzed = ~np.isnan(used)
+    free = np.where(analyzed, np.maximum(total - RESERVED_IPS - np.nan_to_num(used), 0), 0)
+    fragmentation = np.nan_to_num(_as_floats(ip_space["fragmentation_score"], len(total)))
+    largest = _as_floats(ip_space["largest_free_block"], len(total))
+    prefix_blocks = np.nan_to_num(_as_floats(ip_space["free_prefix_blocks"], len(total)))
+
+    free_total = np.bincount(groups, weights=free, minlength=vpc_count)
+    weighted = np.bincount(groups, weights=fragmentation * free, minlength=vpc_count)
+    has_analysis = np.bincount(groups, weights=analyzed, minlength=vpc_count) > 0
+    largest_free_block = np.full(vpc_count, -1.0)
+    np.maximum.at(largest_free_block, groups, np.where(analyzed, largest, -1))
+    without_prefix = analyzed & (free >= PREFIX_BLOCK) & (prefix_blocks == 0)
+
+    return {
+        "fragmentation_score": np.where(
+            has_analysis, np.round(np.divide(weighted, free_total, out=np.zeros(vpc_count), where=free_total > 0), 2), np.nan
+        ),
+        "largest_free_block": np.where(has_analysis, largest_free_block, np.nan),
+        "subnets_without_free_prefix": np.where(has_analysis, np.bincount(groups, weights=without_prefix, minlength=vpc_count), np.nan),
+    }
+
+
+def _ip_space_recommendations(recommendations, subnets_without_free_prefix):
+    """Warn about VPCs whose subnets have free addresses but nowhere to place a /28 prefix"""
+    for index in np.flatnonzero(subnets_without_free_prefix > 0):
+        shared = [r for r in recommendations[index] if r != "VPC is well-configured"]
+        recommendations[index] = shared + [
+            f"{subnets_without_free_prefix[index]:.0f} subnets have free IPs but no free /28 block for prefix delegation"
+            " - consolidate addresses or add a subnet"
+        ]
+    return recommendations
+
+
+def _forecast_recommendations(recommendations, days_to_exhaustion, exhausting):
+    """Append exhaustion warnings for the few VPCs projected to run out of IPs soon"""
+    warned = np.flatnonzero((days_to_exhaustion < FORECAST_WARNING_DAYS) | (exhausting > 0))
+    for index in warned:
+        warnings = []
+        if days_to_exhaustion[index] < FORECAST_WARNING_DAYS:
+            warnings.append(f"Projected to run out of IPs in {days_to_exhaustion[index]:.0f} days - plan added capacity")
+        if exhausting[index]:
+            warnings.append(f"{exhausting[index]} subnets projected to run out of IPs within {FORECAST_WARNING_DAYS:.0f} days")
+        shared = [r for r in recommendations[index] if r != "VPC is well-configured"]
+        recommendations[index] = shared + warnings
+    return recommendations
+
+
+def _vectorized_recommendations(utilization_score, efficiency_score, subnet_count):
+    """
+    recommendations() for arrays. Only the utilization band, subnet count band
+    and efficiency flag matter, so each combination is built once and shared.
+    """
+    utilization_band = np.select([utilization_score < 30, utilization_score > 90], [0, 1], 2)
+    count_band = np.select([subnet_count < 2, subnet_count > 8], [0, 1], 2)
+    inefficient = (efficiency_score < 70).astype(int)
+    combination = (utilization_band * 3 + count_band) * 2 + inefficient
+
+    # representative inputs falling in each band
+    utilization_examples, count_examples = (0, 100, 50), (0, 9, 2)
+    table = np.empty(18, dtype=object)
+    for code in range(18):
+        band, flag = divmod(code, 2)
+        table[code] = recommendations(
+            utilization_examples[band // 3], 50 if flag else 100, count_examples[band % 3]
+        )
+    return table[combination]
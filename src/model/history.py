@@ -0,0 +1,77 @@
+"""
+Helpers for the utilization history store. History is change-point encoded:
+a row (ts, average, minimum, maximum) holds from ts until the entity's next row
+at the same resolution, so an unchanged subnet costs nothing per refresh.
+Values are stored as integer hundredths of a percent.
+"""
+
+import math
+import os
+
+RAW, HOURLY, DAILY = 0, 3600, 86400
+ROLLUPS = (HOURLY, DAILY)
+
+# Days each resolution is kept before it is expired
+HISTORY_RETENTION = {
+    RAW: int(os.getenv("HISTORY_RAW_DAYS", "7")) * DAILY,
+    HOURLY: int(os.getenv("HISTORY_HOURLY_DAYS", "90")) * DAILY,
+    DAILY: int(os.getenv("HISTORY_DAILY_DAYS", "730")) * DAILY,
+}
+
+# Largest number of points returned when no step is requested
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "500"))
+
+
+def source_of(resolution: int) -> int:
+    """The finer resolution a rollup is built from"""
+    return RAW if resolution == HOURLY else HOURLY
+
+
+def choose_resolution(start: int, end: int, step: int, now: int) -> tuple[int, int]:
+    """
+    Pick the cheapest resolution for a query: the coarsest one no wider than
+    the step whose retention still reaches back to start. Returns
+    (resolution, step), defaulting the step to at most HISTORY_MAX_POINTS points.
+    """
+    if step is None:
+        step = max(math.ceil((end - start) / HISTORY_MAX_POINTS), 60)
+    for resolution in (DAILY, HOURLY, RAW):
+        if resolution <= step and start >= now - HISTORY_RETENTION[resolution]:
+            return resolution, step
+    # nothing fine enough is retained that far back, so widen the step
+    for resolution in (HOURLY, DAILY):
+        if start >= now - HISTORY_RETENTION[resolution]:
+            return resolution, max(step, resolution)
+    return DAILY, max(step, DAILY)
+
+
+def aggregate(rows, start: int, end: int, step: int) -> list[tuple[int, int, int, int]]:
+    """
+    Time-weighted (bucket, average, minimum, maximum) per step over [start, end)
+    from change points sorted by ts. The first row may precede start and
+    supplies the value carried into the range. Buckets with no value are skipped.
+    """
+    points = []
+    index = 0
+    for bucket in range(start, end, step):
+        bucket_end = min(bucket + step, end)
+        # skip to the last change point at or before the bucket start
+        while index + 1 < len(rows) and rows[index + 1][0] <= bucket:
+            index += 1
+
+        weighted = covered = 0
+        minimum = maximum = None
+        position = index
+        while position < len(rows) and rows[position][0] < bucket_end:
+            ts, average, low, high = rows[position]
+            segment_end = rows[position + 1][0] if position + 1 < len(rows) else bucket_end
+            overlap = min(segment_end, bucket_end) - max(ts, bucket)
+            if overlap > 0:
+                weighted += average * overlap
+                covered += overlap
+                minimum = low if minimum is None else min(minimum, low)
+                maximum = high if maximum is None else max(maximum, high)
+            position += 1
+        if covered:
+            points.append((bucket, round(weighted / covered), minimum, maximum))
+    return points
@@ -0,0 +1,205 @@
+"""
+Address-space analysis of subnets from their network interfaces. Every used
+address becomes a 64-bit point (subnet row << 32 | offset in the subnet), so
+one sort finds used counts, free runs and free /28 blocks for all subnets at
+once instead of building per-subnet sets of address strings.
+"""
+
+import ipaddress
+import logging
+import numpy as np
+import os
+import warnings
+
+logger = logging.getLogger(__name__)
+
+# Collect describe_network_interfaces and analyze subnet address space on refresh
+ENI_ANALYSIS = os.getenv("ENI_ANALYSIS", "true").lower() in ("1", "true", "yes")
+
+# Per-subnet columns produced by analyze
+IP_SPACE_COLUMNS = ("used_ip_count", "largest_free_block", "free_prefix_blocks", "fragmentation_score")
+
+# AWS keeps the network address, the next three and the broadcast address
+RESERVED_IPS = 5
+# Addresses in a /28, the unit of prefix delegation
+PREFIX_BLOCK = 16
+
+
+# weight of each octet of a dotted address
+OCTET_WEIGHTS = np.array([1 << 24, 1 << 16, 1 << 8, 1], dtype=np.int64)
+
+
+def _to_ints(addresses) -> np.ndarray:
+    """
+    Dotted addresses as int64, parsed by numpy in one pass over the joined
+    text; a malformed address comes back as -1
+    """
+    if not addresses:
+        return np.empty(0, dtype=np.int64)
+    try:
+        with warnings.catch_warnings():
+            # older numpy stops at text it cannot parse with a deprecation warning, newer raises
+            warnings.simplefilter("ignore", DeprecationWarning)
+            octets = np.fromstring(".".join(addresses), dtype=np.int64, sep=".")
+    except ValueError:
+        octets = np.empty(0, dtype=np.int64)
+    if octets.size == 4 * len(addresses):
+        octets = octets.reshape(-1, 4)
+        # octets that spell out exactly each address's text were parsed from that address
+        lengths = np.fromiter(map(len, addresses), dtype=np.int64, count=len(addresses))
+        digits = np.add(octets >= 10, octets >= 100, dtype=np.int8)
+        spelled = 7 + digits[:, 0] + digits[:, 1] + digits[:, 2] + digits[:, 3]
+        if ((octets >= 0) & (octets <= 255)).all() and (spelled == lengths).all():
+            return octets @ OCTET_WEIGHTS
+    # a bad address shifts every octet after it, so find it one address at a time
+    return np.array([_to_int(address) for address in addresses], dtype=np.int64)
+
+
+def _to_int(address: str) -> int:
+    try:
+        return int(ipaddress.IPv4Address(address))
+    except ValueError:
+        return -1
+
+
+def _parse_cidrs(cidr_blocks: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Network addresses and sizes of CIDR blocks, and which blocks were well formed"""
+    networks, prefixes = zip(*(cidr.partition("/")[::2] for cidr in cidr_blocks))
+    prefixes = np.array([int(prefix) if prefix.isdigit() else -1 for prefix in prefixes], dtype=np.int64)
+    networks = _to_ints(networks)
+    valid = (networks >= 0) & (prefixes >= 0) & (prefixes <= 32)
+    return networks, np.left_shift(1, 32 - np.where(valid, prefixes, 32)), valid
+
+
+def parse_cidrs(cidr_blocks: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Network addresses and sizes of IPv4 CIDR blocks as int64 arrays"""
+    if not cidr_blocks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    networks, sizes, valid = _parse_cidrs(cidr_blocks)
+    if not valid.all():
+        raise ValueError(f"invalid CIDR block: {cidr_blocks[int(np.argmin(valid))]}")
+    return networks, sizes
+
+
+def _ranges(starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Every integer of the ranges [start, start + size) concatenated"""
+    ends = np.cumsum(sizes)
+    return np.arange(ends[-1], dtype=np.int64) + np.repeat(starts - (ends - sizes), sizes)
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """np.unique for large int64 arrays; an in-place sort and adjacent compare is much faster"""
+    values.sort()
+    if values.size == 0:
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+class IpUsage:
+    """Collects the private addresses of network interfaces page by page, keyed by subnet"""
+
+    def __init__(self):
+        # subnets are numbered as first seen so addresses carry a small integer owner
+        self._codes = {}
+        self._owners = []
+        self._addresses = []
+        self.interfaces = 0
+
+    def add(self, interfaces: list[dict]) -> None:
+        # one code and address count per interface; owners are expanded with np.repeat
+        codes, counts, addresses = [], [], []
+        prefix_codes, prefixes = [], []
+        for interface in interfaces:
+            subnet_id = interface.get("SubnetId")
+            if not subnet_id:
+                continue
+            code = self._codes.setdefault(subnet_id, len(self._codes))
+            privates = interface.get("PrivateIpAddresses") or ()
+            codes.append(code)
+            counts.append(len(privates))
+            addresses.extend([private["PrivateIpAddress"] for private in privates])
+            for prefix in interface.get("Ipv4Prefixes") or ():
+                prefix_codes.append(code)
+                prefixes.append(prefix["Ipv4Prefix"])
+        self.interfaces += len(interfaces)
+        if addresses:
+            owners = np.repeat(np.array(codes, dtype=np.int64), counts)
+            values = _to_ints(addresses)
+            valid = values >= 0
+            if not valid.all():
+                logger.warning(f"Skipped {np.count_nonzero(~valid)} malformed interface addresses")
+                owners, values = owners[valid], values[valid]
+            self._owners.append(owners)
+            self._addresses.append(values)
+        if prefixes:
+            # delegated prefixes hold every address in them
+            starts, sizes, valid = _parse_cidrs(prefixes)
+            if not valid.all():
+                logger.warning(f"Skipped {np.count_nonzero(~valid)} malformed delegated prefixes")
+                starts, sizes = starts[valid], sizes[valid]
+                prefix_codes = np.array(prefix_codes, dtype=np.int64)[valid]
+            if sizes.size:
+                self._owners.append(np.repeat(np.array(prefix_codes, dtype=np.int64), sizes))
+                self._addresses.append(_ranges(starts, sizes))
+
+    def analyze(self, subnet_ids: list[str], cidr_blocks: list[str]) -> dict:
+        """
+        Per-subnet used addresses, largest contiguous free block, free aligned
+        /28 blocks and fragmentation score (percent of free addresses outside
+        the largest free block), in the order of subnet_ids. Reserved addresses
+        count as taken; addresses outside a subnet's CIDR are ignored.
+        """
+        count = len(subnet_ids)
+        if count == 0:
+            return {column: np.empty(0) for column in IP_SPACE_COLUMNS}
+        networks, sizes = parse_cidrs(cidr_blocks)
+
+        # used addresses as (subnet row, offset) points
+        rows = np.empty(0, dtype=np.int64)
+        offsets = np.empty(0, dtype=np.int64)
+        if self._addresses:
+            index = {subnet_id: row for row, subnet_id in enumerate(subnet_ids)}
+            code_rows = np.array([index.get(subnet_id, -1) for subnet_id in self._codes], dtype=np.int64)
+            owner_rows = code_rows[np.concatenate(self._owners)]
+            known = owner_rows >= 0
+            rows = owner_rows[known]
+            offsets = np.concatenate(self._addresses)[known] - networks[rows]
+            inside = (offsets >= 0) & (offsets < sizes[rows])
+            rows, offsets = rows[inside], offsets[inside]
+
+        # reserved addresses bracket every subnet, so each free run lies between two points
+        reserved_rows = np.repeat(np.arange(count, dtype=np.int64), RESERVED_IPS)
+        reserved_offsets = np.tile(np.array([0, 1, 2, 3, 0], dtype=np.int64), count)
+        reserved_offsets[RESERVED_IPS - 1::RESERVED_IPS] = sizes - 1
+        points = _sorted_unique(np.concatenate([
+            np.left_shift(rows, 32) | offsets,
+            np.left_shift(reserved_rows, 32) | reserved_offsets,
+        ]))
+        point_rows = np.right_shift(points, 32)
+        point_offsets = points & 0xFFFFFFFF
+
+        taken = np.bincount(point_rows, minlength=count)
+        used = np.maximum(taken - np.minimum(sizes, RESERVED_IPS), 0)
+
+        same_subnet = point_rows[1:] == point_rows[:-1]
+        gaps = np.where(same_subnet, point_offsets[1:] - point_offsets[:-1] - 1, 0)
+        largest_free = np.zeros(count, dtype=np.int64)
+        np.maximum.at(largest_free, point_rows[:-1], gaps)
+
+        # a /28 block is free when no point falls in it
+        # points are sorted, so their blocks are too and only need adjacent duplicates dropped
+        blocks = np.left_shift(point_rows, 32) | np.right_shift(point_offsets, 4)
+        blocks = blocks[np.concatenate(([True], blocks[1:] != blocks[:-1]))]
+        occupied = np.bincount(np.right_shift(blocks, 32), minlength=count)
+        free_prefix_blocks = np.maximum(sizes // PREFIX_BLOCK - occupied, 0)
+
+        free = sizes - taken
+        fragmentation = np.divide(
+            100 * (free - largest_free), free, out=np.zeros(count, dtype=float), where=free > 0
+        )
+        return {
+            "used_ip_count": used,
+            "largest_free_block": largest_free,
+            "free_prefix_blocks": free_prefix_blocks,
+            "fragmentation_score": np.round(fragmentation, 2),
+        }
@@ -3,14 +3,37 @@ Model corresponds to all the data-related logic that the user works with
 transferred between the View and Controller components or etc.
 """
 
-from aws.config import AWSConfig
-from sqlalchemy import create_engine, Integer, String, ForeignKey, DateTime
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
-from datetime import datetime
+from aws.collector import DEFAULT_REGION, InventoryCollector
+from db.storage import Storage
+from model.cidrindex import CidrIndex
+from model.grading import GRADE_COLUMNS, IP_SPACE_GRADE_COLUMNS, grade_vpcs
+from model.forecast import FORECAST_SAMPLE_INTERVAL, TREND_COLUMNS, update_trends
+from model.ipspace import ENI_ANALYSIS, IP_SPACE_COLUMNS, RESERVED_IPS, IpUsage
+from model.history import RAW, ROLLUPS, HISTORY_RETENTION, HISTORY_MAX_POINTS, aggregate, choose_resolution, source_of
+from model.snapshot import READ_SNAPSHOT, ReadSnapshot
+from telemetry.metrics import record_refresh
+from sqlalchemy import (
+    and_, cast, delete, exists, func, insert, inspect, literal, or_, select, update,
+    Column, DateTime, Float, ForeignKey, Index, Integer, JSON, MetaData, String, Table,
+)
+from sqlalchemy.orm import DeclarativeBase, Mapped, aliased, mapped_column, relationship
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import NamedTuple, Optional
 import logging
+import numpy as np
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Page size requested from AWS describe calls and rows per bulk insert
+INGEST_PAGE_SIZE = int(os.getenv("INGEST_PAGE_SIZE", "1000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+# Serve the persisted database at boot and build the in-memory read models in the background
+WARM_START = os.getenv("WARM_START", "true").lower() in ("1", "true", "yes")
+
 # Create ORM mapped classes 
 class Base(DeclarativeBase):
     pass
@@ -23,13 +46,21 @@ class Account(Base):
 
 class VPC(Base):
     __tablename__="vpc"
+    __table_args__ = (
+        # covers account -> VPCs lookups without touching the table
+        Index('ix_vpc_account_id_vpc_id', 'account_id', 'vpc_id'),
+        # keyset pagination orders for GET /vpc
+        Index('ix_vpc_utilization_score_vpc_id', 'utilization_score', 'vpc_id'),
+        Index('ix_vpc_last_updated_vpc_id', 'last_updated', 'vpc_id'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    vpc_id: Mapped[str] = mapped_column(String(50))
+    vpc_id: Mapped[str] = mapped_column(String(50), unique=True, index=True)
     account_id: Mapped[int] = mapped_column(Integer)
     name: Mapped[str] = mapped_column(String(20))
     cidr_block: Mapped[str] = mapped_column(String(18))
     state: Mapped[str] = mapped_column(String(20))
+    region: Mapped[str] = mapped_column(String(20), nullable=True)
     utilization_score: Mapped[int] = mapped_column(Integer, default=0)
     subnets: Mapped[list["Subnet"]] = relationship("Subnet", foreign_keys="Subnet.vpc_id")
     last_updated: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -37,60 +68,255 @@ class VPC(Base):
 
 class Subnet(Base):
     __tablename__="subnet"
+    __table_args__ = (
+        # covers VPC -> subnets lookups and the utilization rollup
+        Index('ix_subnet_vpc_id_cover', 'vpc_id', 'total_ip_count', 'utilization_score'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    subnet_id: Mapped[str] = mapped_column(String(50))
+    subnet_id: Mapped[str] = mapped_column(String(50), unique=True, index=True)
     vpc_id: Mapped[str] = mapped_column(String(50), ForeignKey("vpc.vpc_id"))
-    account_id: Mapped[int] = mapped_column(Integer)
+    account_id: Mapped[int] = mapped_column(Integer, index=True)
     name: Mapped[str] = mapped_column(String(20))
     cidr_block: Mapped[str] = mapped_column(String(18))
     state: Mapped[str] = mapped_column(String(20))
+    region: Mapped[str] = mapped_column(String(20), nullable=True)
     availability_zone: Mapped[str] = mapped_column(String(20))
     available_ip_count: Mapped[int] = mapped_column(Integer)
     total_ip_count: Mapped[int] = mapped_column(Integer)
     utilization_score: Mapped[int] = mapped_column(Integer)
+    # address-space analysis from network interfaces; see model.ipspace
+    used_ip_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    largest_free_block: Mapped[int] = mapped_column(Integer, nullable=True)
+    free_prefix_blocks: Mapped[int] = mapped_column(Integer, nullable=True)
+    fragmentation_score: Mapped[float] = mapped_column(Float, nullable=True)
     last_updated: Mapped[datetime] = mapped_column(DateTime,default=datetime.utcnow)
 
+class Grade(Base):
+    __tablename__="grade"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    vpc_id: Mapped[str] = mapped_column(String(50), unique=True, index=True)
+    overall_score: Mapped[float] = mapped_column(Float)
+    overall_grade: Mapped[str] = mapped_column(String(2))
+    utilization_score: Mapped[float] = mapped_column(Float)
+    utilization_grade: Mapped[str] = mapped_column(String(2))
+    efficiency_score: Mapped[int] = mapped_column(Integer)
+    efficiency_grade: Mapped[str] = mapped_column(String(2))
+    cost_score: Mapped[float] = mapped_column(Float)
+    cost_grade: Mapped[str] = mapped_column(String(2))
+    subnet_count: Mapped[int] = mapped_column(Integer)
+    days_to_exhaustion: Mapped[float] = mapped_column(Float, nullable=True)
+    fragmentation_score: Mapped[float] = mapped_column(Float, nullable=True)
+    largest_free_block: Mapped[int] = mapped_column(Integer, nullable=True)
+    subnets_without_free_prefix: Mapped[int] = mapped_column(Integer, nullable=True)
+    recommendations: Mapped[list] = mapped_column(JSON)
+
+class UtilizationHistory(Base):
+    __tablename__="utilization_history"
+    __table_args__ = (
+        Index('ix_utilization_history_resolution_ts', 'resolution', 'ts'),
+        {'sqlite_with_rowid': False},
+    )
+
+    # change points per subnet/VPC id; see model.history
+    entity_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    resolution: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    ts: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    average: Mapped[int] = mapped_column(Integer)
+    minimum: Mapped[int] = mapped_column(Integer)
+    maximum: Mapped[int] = mapped_column(Integer)
+
+class UtilizationTrend(Base):
+    __tablename__="utilization_trend"
+    __table_args__ = ({'sqlite_with_rowid': False},)
+
+    # running regression state per subnet/VPC id; see model.forecast
+    entity_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    origin: Mapped[int] = mapped_column(Integer)
+    last_ts: Mapped[int] = mapped_column(Integer)
+    samples: Mapped[int] = mapped_column(Integer)
+    weight: Mapped[float] = mapped_column(Float)
+    mean_t: Mapped[float] = mapped_column(Float)
+    mean_y: Mapped[float] = mapped_column(Float)
+    c_tt: Mapped[float] = mapped_column(Float)
+    c_ty: Mapped[float] = mapped_column(Float)
+    slope: Mapped[float] = mapped_column(Float)
+    days_to_exhaustion: Mapped[float] = mapped_column(Float, nullable=True)
+
+class HistoryWatermark(Base):
+    __tablename__="history_watermark"
+
+    resolution: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    rolled_until: Mapped[int] = mapped_column(Integer)
+
+class Generation(Base):
+    __tablename__="generation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+    # when the data last changed, and when a refresh last confirmed it
+    published_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+# Staging tables are TEMPORARY: each refresh builds its inventory on its own
+# connection, so refreshes in other processes sharing the database never see
+# or clear it. They are created at the start of a refresh, not with the schema.
+staging_metadata = MetaData()
+
+
+def _staging_table(table, key):
+    """Temporary copy of a table, unique on its key only, that one refresh is built into"""
+    return Table(
+        f'{table.name}_staging',
+        staging_metadata,
+        *[
+            Column(column.name, column.type, index=column.name == key, unique=column.name == key)
+            for column in table.columns
+            if not column.primary_key and column.name != 'last_updated'
+        ],
+        prefixes=['TEMPORARY'],
+    )
+
+vpc_staging = _staging_table(VPC.__table__, 'vpc_id')
+subnet_staging = _staging_table(Subnet.__table__, 'subnet_id')
+
+# per-subnet address-space analysis, merged into subnet_staging before publishing
+ip_space_staging = Table(
+    'subnet_ip_space_staging',
+    staging_metadata,
+    Column('subnet_id', String(50), index=True),
+    *[Column(column.name, column.type) for column in Subnet.__table__.columns if column.name in IP_SPACE_COLUMNS],
+    prefixes=['TEMPORARY'],
+)
+
+
+def migrate_schema(engine):
+    """Bring an existing database up to the current columns, indexes and unique keys"""
+    with engine.begin() as connection:
+        # staging used to be permanent tables shared by every process
+        for staging in staging_metadata.sorted_tables:
+            if inspect(connection).has_table(staging.name):
+                connection.exec_driver_sql(f'DROP TABLE {staging.name}')
+        
+        for table, key in ((Subnet, 'subnet_id'), (VPC, 'vpc_id'), (Grade, 'vpc_id'), (Generation, 'id')):
+            existing = {column['name'] for column in inspect(connection).get_columns(table.__tablename__)}
+            for column in table.__table__.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {table.__tablename__} ADD COLUMN {column.name} {column_type}'
+                    )
+                    logger.info(f"Added column {table.__tablename__}.{column.name}")
+            
+            # keep the newest row for any duplicated natural key before it becomes unique
+            newest = select(func.max(table.id)).group_by(getattr(table, key))
+            removed = connection.execute(delete(table).where(table.id.not_in(newest))).rowcount
+            if removed:
+                logger.info(f"Removed {removed} duplicate rows from {table.__tablename__}")
+            for index in table.__table__.indexes:
+                index.create(connection, checkfirst=True)
+        
+        # rows published before collection was per target all came from the default region;
+        # without one a failed collection could not protect them
+        for table in (VPC, Subnet):
+            filled = connection.execute(
+                update(table).where(table.region.is_(None)).values(region=DEFAULT_REGION)
+            ).rowcount
+            if filled:
+                logger.info(f"Set region {DEFAULT_REGION} on {filled} {table.__tablename__} rows")
+
+
+# Columns compared against AWS on refresh; a row is rewritten only when one differs
+VPC_SYNC_COLUMNS = ('account_id', 'name', 'cidr_block', 'state', 'region')
+SUBNET_SYNC_COLUMNS = (
+    'vpc_id', 'account_id', 'name', 'cidr_block', 'state', 'region', 'availability_zone',
+    'available_ip_count', 'total_ip_count', 'utilization_score', *IP_SPACE_COLUMNS,
+)
+
+# Describe calls staged on every refresh and the response key holding their items
+INVENTORY_OPERATIONS = [('describe_vpcs', 'Vpcs'), ('describe_subnets', 'Subnets')]
+if ENI_ANALYSIS:
+    INVENTORY_OPERATIONS.append(('describe_network_interfaces', 'NetworkInterfaces'))
+# Id of each described item; the same resource can be listed by several targets
+INVENTORY_KEYS = {
+    'describe_vpcs': 'VpcId', 'describe_subnets': 'SubnetId', 'describe_network_interfaces': 'NetworkInterfaceId',
+}
+
+
+
+class RefreshScope(NamedTuple):
+    """Part of the inventory a refresh collects and publishes; empty means everything"""
+
+    account_id: Optional[int] = None
+    vpc_id: Optional[str] = None
 
-# we want have every subnet and calculate based on (total - avail) / total 
+    @property
+    def is_full(self) -> bool:
+        return self.account_id is None and self.vpc_id is None
+
+    def covers(self, other: "RefreshScope") -> bool:
+        """Whether refreshing this scope also refreshes other"""
+        return self.is_full or self == other
+
+    def filters(self) -> list[dict]:
+        """describe_* filters limiting every collected item to the scope"""
+        filters = []
+        if self.account_id is not None:
+            filters.append({'Name': 'owner-id', 'Values': [str(self.account_id)]})
+        if self.vpc_id is not None:
+            filters.append({'Name': 'vpc-id', 'Values': [self.vpc_id]})
+        return filters
+
+# we want have every subnet and calculate based on (usable - avail) / usable 
 
 class modelConfig:
-    def __init__(self, client: AWSConfig):
+    def __init__(self, client, storage=None, warm_start: bool = WARM_START, migrate: bool = True):
+        # accept a bare EC2 client as a single-target collector
+        if not isinstance(client, InventoryCollector):
+            client = InventoryCollector.for_client(client)
         self.client = client
-        self.engine = create_engine("sqlite:///db/model.db")
-        Base.metadata.create_all(self.engine)
-        logger.info("Database tables created successfully")
-        self.update_db()
+        self.storage = storage or Storage()
+        self.engine = self.storage.write_engine
+        
+        # a process that only reads leaves the schema to the one that refreshes
+        if migrate:
+            Base.metadata.create_all(self.engine)
+            migrate_schema(self.engine)
+            logger.info("Database tables created successfully")
+            self._backfill_grades()
+        
+        # optional in-memory copy of the published data that reads are served from
+        self.snapshot = None
+        self._snapshot_lock = threading.Lock()
+        # overlap and address lookup index over every CIDR block, rebuilt at each publish
+        self.cidr_index = None
+        self.read_models_loaded = threading.Event()
+        if warm_start:
+            # reads fall back to the database until the models are swapped in
+            threading.Thread(target=self._load_read_models, name="read-models", daemon=True).start()
+        else:
+            self._load_read_models()
+    
+    def _backfill_grades(self):
+        """Grade databases published before grades were materialized"""
+        Session = self.storage.WriteSession
+        with Session() as session:
+            if session.scalar(select(Grade.id).limit(1)) is None and session.scalar(select(VPC.id).limit(1)):
+                graded = self._materialize_grades(session)
+                session.commit()
+                logger.info(f"Backfilled grades for {graded} VPCs")
     
     def calculate_vpc_utilization(self, vpc_id):
         """Calculate VPC utilization based on its subnets"""
-        Session = sessionmaker(bind=self.engine)
+        Session = self.storage.WriteSession
         session = Session()
         
         try:
-            vpc = session.query(VPC).filter(VPC.vpc_id == vpc_id).first()
-            if not vpc:
-                return 0
-                
-            subnets = session.query(Subnet).filter(Subnet.vpc_id == vpc_id).all()
-            if not subnets:
-                return 0
-                
-            # Calculate weighted average based on subnet sizes
-            total_ips = sum(subnet.total_ip_count for subnet in subnets)
-            if total_ips == 0:
-                return 0
-                
-            weighted_utilization = sum(
-                subnet.utilization_score * (subnet.total_ip_count / total_ips) 
-                for subnet in subnets
-            )
-            
-            # Update VPC utilization score
-            vpc.utilization_score = round(weighted_utilization, 2)
+            self._rollup_vpc_utilization(session, vpc_id)
             session.commit()
-            
-            return vpc.utilization_score
+            return session.scalar(select(VPC.utilization_score).where(VPC.vpc_id == vpc_id)) or 0
             
         except Exception as e:
             logger.error(f"Failed to calculate VPC utilization for {vpc_id}: {e}")
@@ -98,73 +324,83 @@ class modelConfig:
             return 0
         finally:
             session.close()
+
+    def rollup_vpc_utilization(self):
+        """Recalculate utilization for every VPC, returning the number of VPCs changed"""
+        Session = self.storage.WriteSession
+        with Session() as session:
+            changed = self._rollup_vpc_utilization(session)
+            session.commit()
+            return changed
+
+    def _rollup_vpc_utilization(self, session, vpc_id=None):
+        """Write total-IP-weighted subnet utilization back to VPCs with one aggregate UPDATE"""
+        weighted = (
+            select(
+                Subnet.vpc_id,
+                (func.sum(Subnet.utilization_score * Subnet.total_ip_count)
+                 / func.nullif(func.sum(Subnet.total_ip_count), 0)).label('score'),
+            )
+            .group_by(Subnet.vpc_id)
+            .subquery()
+        )
+        # VPCs without sized subnets roll up to 0
+        rollup = (
+            select(VPC.vpc_id, func.round(func.coalesce(weighted.c.score, 0), 2).label('score'))
+            .outerjoin(weighted, weighted.c.vpc_id == VPC.vpc_id)
+        )
+        if vpc_id is not None:
+            rollup = rollup.where(VPC.vpc_id == vpc_id)
+        rollup = rollup.subquery()
+        
+        return session.execute(
+            update(VPC)
+            .where(VPC.vpc_id == rollup.c.vpc_id)
+            .where(VPC.utilization_score.is_distinct_from(rollup.c.score))
+            .values(utilization_score=rollup.c.score, last_updated=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
     
-    def seed_db(self):
-        logger.info("Starting database seeding...")
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+    def seed_db(self, scope: RefreshScope = None, progress=None):
+        """
+        Build a fresh inventory in the staging tables, then publish it
+        atomically. A scope limits collection and publishing to one account or
+        VPC; progress is called with (stage, details) as the refresh advances.
+        """
+        scope = scope or RefreshScope()
+        progress = progress or (lambda stage, details=None: None)
+        logger.info(f"Starting database seeding{'' if scope.is_full else f' for {scope}'}...")
+        Session = self.storage.WriteSession
+        # the staging tables only exist on this connection, so the whole refresh runs on it
+        connection = self.engine.connect()
+        session = Session(bind=connection)
         
         try:
-            vpcs = self.client.describe_vpcs()
-            subnets = self.client.describe_subnets()
-            logger.info(f"Retrieved {len(vpcs.get('Vpcs', []))} VPCs and {len(subnets.get('Subnets', []))} subnets from AWS")
-
-            for vpc in vpcs.get('Vpcs'):
-                name = 'unknown'
-                for tag in vpc.get('Tags', []):
-                    if tag.get('Key') == 'Name':
-                        name = tag.get('Value', 'unknown')
-                        break
-                        
-                db_vpc = VPC(
-                    vpc_id=vpc['VpcId'],
-                    account_id=int(vpc.get('OwnerId', 0)),
-                    name=name,
-                    cidr_block=vpc['CidrBlock'],
-                    state=vpc['State'],
-                )
-                session.add(db_vpc)
-                logger.info(f"Added VPC: {vpc['VpcId']} ({name})")
-            
-            for subnet in subnets.get('Subnets'):
-                name = 'unknown'
-                for tag in subnet.get('Tags', []):
-                    if tag.get('Key') == 'Name':
-                        name = tag.get('Value', 'unknown')
-                        break
-                        
-                db_subnet = Subnet(
-                    subnet_id=subnet['SubnetId'],
-                    vpc_id=subnet['VpcId'],
-                    account_id=int(subnet.get('OwnerId', 0)),
-                    name=name,
-                    cidr_block=subnet['CidrBlock'],
-                    state=subnet['State'],
-                    availability_zone=subnet['AvailabilityZone'],
-                    available_ip_count=subnet['AvailableIpAddressCount'],
-                    total_ip_count=2**(32 - int(subnet['CidrBlock'].split('/')[1])),
-                    utilization_score=0
-                )
-                
-                # calculate subnet utilization score
-                total_ips = db_subnet.total_ip_count
-                used_ips = total_ips - subnet['AvailableIpAddressCount']
-                if total_ips > 0:
-                    utilization_percentage = (used_ips / total_ips) * 100
-                    db_subnet.utilization_score = round(utilization_percentage, 2)
-                
-                session.add(db_subnet)
-                logger.info(f"Added Subnet: {subnet['SubnetId']} ({name}) - {subnet['AvailableIpAddressCount']} IPs available")
-            
+            staging_metadata.create_all(session.connection())
             session.commit()
             
-            # calculate VPC utilization scores after all subnets are added
-            logger.info("Calculating VPC utilization scores...")
-            for vpc in vpcs.get('Vpcs'):
-                utilization = self.calculate_vpc_utilization(vpc['VpcId'])
-                logger.info(f"VPC {vpc['VpcId']} utilization: {utilization}%")
+            # staging is committed page by page; live tables are untouched until publish
+            targets = self._scope_targets(session, scope)
+            usage = IpUsage() if ENI_ANALYSIS else None
+            progress('collecting')
+            staged = self._ingest(session, usage, targets, scope.filters(), progress)
+            logger.info(f"Staged {staged['describe_vpcs']} VPCs and {staged['describe_subnets']} subnets from AWS")
+            if usage is not None:
+                progress('analyzing', staged)
+                self._analyze_ip_space(session, usage)
+                session.commit()
             
+            failed = dict(self.client.errors)
+            if len(failed) == len(targets):
+                raise RuntimeError(f"Inventory collection failed for every target: {list(failed.values())}")
+            
+            progress('publishing', staged)
+            counts = self._publish(session, failed, scope)
+            counts['failed_targets'] = {target.label: error for target, error in failed.items()}
+            if counts['changed']:
+                self.refresh_read_models()
             logger.info("Database seeding completed successfully")
+            return counts
             
         except Exception as e:
             session.rollback()
@@ -172,32 +408,641 @@ class modelConfig:
             raise
         finally:
             session.close()
+            # pooled connections outlive the refresh, so its staging goes with it
+            with connection.begin():
+                staging_metadata.drop_all(connection)
+            connection.close()
+
+    def _scope_targets(self, session, scope):
+        """Collection targets that can hold the scope's resources"""
+        targets = self.client.targets
+        if scope.vpc_id is not None:
+            vpc = session.execute(
+                select(VPC.account_id, VPC.region).where(VPC.vpc_id == scope.vpc_id)
+            ).first()
+            # an unknown VPC may be new, so every target is searched for it
+            if vpc is not None:
+                targets = [
+                    target for target in targets
+                    if target.region == vpc.region and target.account in (None, vpc.account_id)
+                ] or targets
+        if scope.account_id is not None:
+            targets = [target for target in targets if target.account in (None, scope.account_id)]
+            if not targets:
+                raise ValueError(f"No collection target can reach account {scope.account_id}")
+        return targets
+
+    def _ingest(self, session, usage=None, targets=None, filters=None, progress=None):
+        """
+        Stream paginated describe calls from every target into chunked bulk
+        inserts; network interfaces are only collected into usage
+        """
+        tables = {
+            'describe_vpcs': (vpc_staging, self._vpc_row),
+            'describe_subnets': (subnet_staging, self._subnet_row),
+        }
+        totals = {operation: 0 for operation, _ in INVENTORY_OPERATIONS}
+        seen = {operation: set() for operation, _ in INVENTORY_OPERATIONS}
+        pages = self.client.collect(INVENTORY_OPERATIONS, INGEST_PAGE_SIZE, targets, filters)
+        for target, operation, items in pages:
+            # shared VPCs and overlapping targets report a resource more than once; the first copy wins
+            key, staged = INVENTORY_KEYS[operation], seen[operation]
+            unique = []
+            for item in items:
+                if item[key] not in staged:
+                    staged.add(item[key])
+                    unique.append(item)
+            if len(unique) < len(items):
+                logger.info(f"{target.label} {operation}: skipped {len(items) - len(unique)} already staged")
+            items = unique
+            if operation == 'describe_network_interfaces':
+                usage.add(items)
+                totals[operation] += len(items)
+                if progress:
+                    progress('collecting', totals)
+                continue
+            table, to_row = tables[operation]
+            rows = [to_row(item, target.region) for item in items]
+            for start in range(0, len(rows), INGEST_BATCH_SIZE):
+                session.execute(insert(table), rows[start:start + INGEST_BATCH_SIZE])
+            session.commit()
+            totals[operation] += len(rows)
+            logger.info(f"{target.label} {operation}: staged {len(rows)} rows ({totals[operation]} total)")
+            if progress:
+                progress('collecting', totals)
+        return totals
+
+    def _analyze_ip_space(self, session, usage):
+        """Analyze every staged subnet's address space and merge the results into staging"""
+        subnet_ids, cidr_blocks = [], []
+        for subnet_id, cidr_block in session.execute(select(subnet_staging.c.subnet_id, subnet_staging.c.cidr_block)):
+            subnet_ids.append(subnet_id)
+            cidr_blocks.append(cidr_block)
+        analysis = {column: values.tolist() for column, values in usage.analyze(subnet_ids, cidr_blocks).items()}
+        rows = [
+            {'subnet_id': subnet_id, **{column: analysis[column][index] for column in IP_SPACE_COLUMNS}}
+            for index, subnet_id in enumerate(subnet_ids)
+        ]
+        session.execute(delete(ip_space_staging))
+        for start in range(0, len(rows), INGEST_BATCH_SIZE):
+            session.execute(insert(ip_space_staging), rows[start:start + INGEST_BATCH_SIZE])
+        session.execute(
+            update(subnet_staging)
+            .where(subnet_staging.c.subnet_id == ip_space_staging.c.subnet_id)
+            .values({column: ip_space_staging.c[column] for column in IP_SPACE_COLUMNS})
+        )
+        logger.info(f"Analyzed address space of {len(rows)} subnets from {usage.interfaces} network interfaces")
+
+    def _publish(self, session, failed=None, scope=None):
+        """
+        Apply the staged inventory to the live tables in one transaction. The
+        generation only moves when rows, history or trends changed, so cached
+        responses of an unchanged inventory stay valid.
+        """
+        now = datetime.utcnow()
+        keep = self._kept_scope(failed or {}, scope or RefreshScope())
+        subnet_deleted = self._delete_missing(session, Subnet, subnet_staging, 'subnet_id', keep)
+        vpc_counts = self._upsert(session, VPC, vpc_staging, 'vpc_id', VPC_SYNC_COLUMNS, now)
+        subnet_counts = self._upsert(session, Subnet, subnet_staging, 'subnet_id', SUBNET_SYNC_COLUMNS, now)
+        vpc_counts['deleted'] = self._delete_missing(session, VPC, vpc_staging, 'vpc_id', keep)
+        subnet_counts['deleted'] = subnet_deleted
+        
+        # calculate VPC utilization scores after all subnets are published
+        vpc_counts['rescored'] = self._rollup_vpc_utilization(session)
+        ts = int(now.replace(tzinfo=timezone.utc).timestamp())
+        appended = self._record_history(session, ts)
+        trended = self._update_trends(session, ts)
+        
+        generation = session.get(Generation, 1)
+        changed = generation is None or any(vpc_counts.values()) or any(subnet_counts.values()) or appended or trended
+        if changed:
+            self._materialize_grades(session)
+            generation = generation or Generation(id=1, generation=0)
+            generation.generation += 1
+            generation.published_at = now
+        generation.refreshed_at = now
+        session.add(generation)
+        # read before commit, which expires it and would reload it in a new transaction
+        number = generation.generation
+        session.commit()
+        if changed:
+            logger.info(f"Published generation {number} - VPCs: {vpc_counts}, subnets: {subnet_counts}")
+        else:
+            logger.info(f"No changes, generation {number} kept")
+        return {
+            'generation': number, 'changed': bool(changed),
+            'vpcs': vpc_counts, 'subnets': subnet_counts,
+        }
+
+    def _materialize_grades(self, session):
+        """Rebuild the grade table from the published VPCs within the caller's transaction"""
+        grades = [
+            {column: value for column, value in grade.items() if column != 'name'}
+            for grade in self.grade_all_vpcs(session)
+        ]
+        session.execute(delete(Grade))
+        for start in range(0, len(grades), INGEST_BATCH_SIZE):
+            session.execute(insert(Grade), grades[start:start + INGEST_BATCH_SIZE])
+        return len(grades)
+
+    def _record_history(self, session, ts):
+        """
+        Append a history change point for every subnet and VPC whose
+        utilization moved, returning the points appended and buckets rolled up
+        """
+        history = UtilizationHistory
+        changed = 0
+        for table, key in ((Subnet, Subnet.subnet_id), (VPC, VPC.vpc_id)):
+            value = cast(func.round(table.utilization_score * 100), Integer)
+            last = (
+                select(history.average)
+                .where(history.entity_id == key, history.resolution == RAW)
+                .order_by(history.ts.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            changed += session.execute(
+                insert(history)
+                .from_select(
+                    ['entity_id', 'resolution', 'ts', 'average', 'minimum', 'maximum'],
+                    select(key, literal(RAW), literal(ts), value, value, value).where(
+                        last.is_distinct_from(value),
+                        # a second refresh within the same second keeps the first point
+                        ~exists().where(history.entity_id == key, history.resolution == RAW, history.ts == ts),
+                    ),
+                )
+            ).rowcount
+        
+        closed = self._rollup_history(session, ts)
+        if closed:
+            self._expire_history(session, ts)
+        return changed + closed
+
+    def _rollup_history(self, session, ts):
+        """Downsample every closed hourly and daily bucket, returning how many were closed"""
+        closed = 0
+        for resolution in ROLLUPS:
+            watermark = session.get(HistoryWatermark, resolution)
+            if watermark is None:
+                first = session.scalar(
+                    select(func.min(UtilizationHistory.ts)).where(UtilizationHistory.resolution == source_of(resolution))
+                )
+                if first is None:
+                    continue
+                watermark = HistoryWatermark(resolution=resolution, rolled_until=first // resolution * resolution)
+                session.add(watermark)
+            while watermark.rolled_until + resolution <= ts // resolution * resolution:
+                self._rollup_bucket(session, resolution, watermark.rolled_until)
+                watermark.rolled_until += resolution
+                closed += 1
+        return closed
+
+    def _rollup_bucket(self, session, resolution, bucket):
+        """Write rollup change points for entities whose source rows changed around one bucket"""
+        history, earlier = UtilizationHistory, aliased(UtilizationHistory)
+        source = source_of(resolution)
+        bucket_end = bucket + resolution
+        
+        # an entity changed in this bucket or the one before, when its last rollup may have varied
+        candidates = (
+            select(history.entity_id)
+            .where(history.resolution == source, history.ts >= bucket - resolution, history.ts < bucket_end)
+            .distinct()
+        )
+        base_ts = (
+            select(func.max(earlier.ts))
+            .where(earlier.entity_id == history.entity_id, earlier.resolution == source, earlier.ts <= bucket)
+            .scalar_subquery()
+        )
+        rows = session.execute(
+            select(history.entity_id, history.ts, history.average, history.minimum, history.maximum)
+            .where(
+                history.resolution == source,
+                history.entity_id.in_(candidates),
+                history.ts >= func.coalesce(base_ts, bucket),
+                history.ts < bucket_end,
+            )
+            .order_by(history.entity_id, history.ts)
+        ).all()
+        
+        previous_ts = (
+            select(func.max(earlier.ts))
+            .where(earlier.entity_id == history.entity_id, earlier.resolution == resolution, earlier.ts < bucket)
+            .scalar_subquery()
+        )
+        previous = {
+            row.entity_id: tuple(row[1:])
+            for row in session.execute(
+                select(history.entity_id, history.average, history.minimum, history.maximum)
+                .where(history.resolution == resolution, history.entity_id.in_(candidates), history.ts == previous_ts)
+            )
+        }
+        
+        changes = []
+        for entity_id, entity_rows in groupby(rows, key=lambda row: row.entity_id):
+            points = aggregate([tuple(row[1:]) for row in entity_rows], bucket, bucket_end, resolution)
+            if points and points[0][1:] != previous.get(entity_id):
+                _, average, minimum, maximum = points[0]
+                changes.append({
+                    'entity_id': entity_id, 'resolution': resolution, 'ts': bucket,
+                    'average': average, 'minimum': minimum, 'maximum': maximum,
+                })
+        for start in range(0, len(changes), INGEST_BATCH_SIZE):
+            session.execute(insert(history), changes[start:start + INGEST_BATCH_SIZE])
+        return len(changes)
+
+    def _expire_history(self, session, ts):
+        """Drop history past each resolution's retention, keeping the value carried into it"""
+        history, newer = UtilizationHistory, aliased(UtilizationHistory)
+        for resolution, retention in HISTORY_RETENTION.items():
+            cutoff = ts - retention
+            session.execute(
+                delete(history)
+                .where(
+                    history.resolution == resolution,
+                    history.ts < cutoff,
+                    exists().where(
+                        newer.entity_id == history.entity_id,
+                        newer.resolution == resolution,
+                        newer.ts > history.ts,
+                        newer.ts <= cutoff,
+                    ),
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    def get_history(self, entity_id, start, end, step=None):
+        """
+        Return (resolution, step, points) of an entity's utilization over
+        [start, end) epoch seconds, read from the cheapest retained rollup.
+        Points are (bucket, average, minimum, maximum) in percent.
+        """
+        resolution, step = choose_resolution(start, end, step, int(time.time()))
+        if step <= 0 or (end - start) / step > HISTORY_MAX_POINTS * 10:
+            raise ValueError("step is too small for the requested range")
+        
+        Session = self.storage.ReadSession
+        with Session() as session:
+            rows = []
+            tail_start = start
+            if resolution != RAW:
+                watermark = session.get(HistoryWatermark, resolution)
+                tail_start = max(watermark.rolled_until if watermark else start, start)
+                rows = self._history_rows(session, entity_id, resolution, start, tail_start)
+            # buckets not rolled up yet come from the raw samples
+            tail = self._history_rows(session, entity_id, RAW, tail_start, end)
+            if rows and tail and tail[0][0] < tail_start:
+                tail[0] = (tail_start, *tail[0][1:])
+            rows += tail
+        
+        points = [
+            (bucket, average / 100, minimum / 100, maximum / 100)
+            for bucket, average, minimum, maximum in aggregate(rows, start, end, step)
+        ]
+        return resolution, step, points
+
+    def _history_rows(self, session, entity_id, resolution, start, end):
+        """Change points in [start, end) plus the one carried into start"""
+        if end <= start:
+            return []
+        history = UtilizationHistory
+        base_ts = (
+            select(func.max(history.ts))
+            .where(history.entity_id == entity_id, history.resolution == resolution, history.ts <= start)
+            .scalar_subquery()
+        )
+        return [
+            tuple(row)
+            for row in session.execute(
+                select(history.ts, history.average, history.minimum, history.maximum)
+                .where(
+                    history.entity_id == entity_id,
+                    history.resolution == resolution,
+                    history.ts >= func.coalesce(base_ts, start),
+                    history.ts < end,
+                )
+                .order_by(history.ts)
+            )
+        ]
+
+    def _update_trends(self, session, ts):
+        """Feed current utilization into each subnet's and VPC's exhaustion trend"""
+        due = ts - FORECAST_SAMPLE_INTERVAL
+        trend = UtilizationTrend
+        updated = 0
+        for table, key in ((Subnet, Subnet.subnet_id), (VPC, VPC.vpc_id)):
+            rows = session.execute(
+                select(key, table.utilization_score, *[getattr(trend, column) for column in TREND_COLUMNS])
+                .outerjoin(trend, trend.entity_id == key)
+                .where(or_(trend.last_ts.is_(None), trend.last_ts <= due))
+            ).all()
+            if not rows:
+                continue
+            entity_ids, values, *state = zip(*rows)
+            existing = [origin is not None for origin in state[0]]
+            state = {
+                column: np.array([value or 0 for value in values_], dtype=float)
+                for column, values_ in zip(TREND_COLUMNS, state)
+            }
+            trends = update_trends(state, ts, [value or 0 for value in values])
+            
+            columns = {column: trends[column].tolist() for column in (*TREND_COLUMNS, 'slope')}
+            days = [None if np.isnan(day) else day for day in trends['days_to_exhaustion'].tolist()]
+            inserts, updates = [], []
+            for index, entity_id in enumerate(entity_ids):
+                row = {column: values_[index] for column, values_ in columns.items()}
+                row.update(entity_id=entity_id, days_to_exhaustion=days[index])
+                (updates if existing[index] else inserts).append(row)
+            for start in range(0, len(inserts), INGEST_BATCH_SIZE):
+                session.execute(insert(trend), inserts[start:start + INGEST_BATCH_SIZE])
+            for start in range(0, len(updates), INGEST_BATCH_SIZE):
+                session.execute(update(trend), updates[start:start + INGEST_BATCH_SIZE])
+            updated += len(rows)
+        
+        # trends of subnets and VPCs that no longer exist
+        session.execute(
+            delete(trend)
+            .where(~exists().where(Subnet.subnet_id == trend.entity_id))
+            .where(~exists().where(VPC.vpc_id == trend.entity_id))
+            .execution_options(synchronize_session=False)
+        )
+        return updated
+
+    def grade_all_vpcs(self, session):
+        """Grade every VPC from its subnet columns, loaded in a single query"""
+        subnet_trend, vpc_trend = aliased(UtilizationTrend), aliased(UtilizationTrend)
+        rows = session.execute(
+            select(
+                VPC.vpc_id, VPC.name, Subnet.total_ip_count, Subnet.utilization_score,
+                subnet_trend.days_to_exhaustion, vpc_trend.days_to_exhaustion,
+                *[getattr(Subnet, column) for column in IP_SPACE_COLUMNS],
+            )
+            .outerjoin(Subnet, Subnet.vpc_id == VPC.vpc_id)
+            .outerjoin(subnet_trend, subnet_trend.entity_id == Subnet.subnet_id)
+            .outerjoin(vpc_trend, vpc_trend.entity_id == VPC.vpc_id)
+            .order_by(VPC.vpc_id)
+        ).all()
+        if not rows:
+            return []
+        vpc_ids, names, total_ip_counts, utilization_scores, subnet_days, vpc_days, *ip_space = zip(*rows)
+        graded = grade_vpcs(
+            vpc_ids, total_ip_counts, utilization_scores, subnet_days, vpc_days,
+            dict(zip(IP_SPACE_COLUMNS, ip_space)),
+        )
+        
+        names = dict(zip(vpc_ids, names))
+        columns = {column: graded[column].tolist() for column in GRADE_COLUMNS}
+        # NaN marks a VPC without a forecast or address-space analysis
+        optional = {
+            column: [None if np.isnan(value) else value for value in graded[column].tolist()]
+            for column in ('days_to_exhaustion', *IP_SPACE_GRADE_COLUMNS)
+        }
+        for column in ('largest_free_block', 'subnets_without_free_prefix'):
+            optional[column] = [None if value is None else int(value) for value in optional[column]]
+        return [
+            {
+                'vpc_id': vpc_id,
+                'name': names[vpc_id],
+                **{column: values[index] for column, values in columns.items()},
+                **{column: values[index] for column, values in optional.items()},
+                'recommendations': graded['recommendations'][index],
+            }
+            for index, vpc_id in enumerate(graded['vpc_id'])
+        ]
+
+    @classmethod
+    def _kept_scope(cls, failed, scope):
+        """Per-table filters matching rows a publish must not delete: failed targets and rows outside the scope"""
+        failed_scope = cls._failed_scope(failed)
+
+        def keep(table):
+            kept = failed_scope(table)
+            clauses = []
+            if scope.account_id is not None:
+                clauses.append(table.account_id == scope.account_id)
+            if scope.vpc_id is not None:
+                clauses.append(table.vpc_id == scope.vpc_id)
+            if clauses:
+                outside = ~and_(*clauses)
+                kept = outside if kept is None else or_(kept, outside)
+            return kept
+        return keep
+
+    @staticmethod
+    def _failed_scope(failed):
+        """Per-table filters matching rows owned by targets that failed to collect"""
+        def scope(table):
+            clauses = []
+            for target in failed:
+                clause = table.region == target.region
+                if target.account is not None:
+                    clause = and_(clause, table.account_id == target.account)
+                clauses.append(clause)
+            return or_(*clauses) if clauses else None
+        return scope
+
+    def _upsert(self, session, table, staging, key, columns, now):
+        """Insert staged rows that are new and rewrite rows whose values changed"""
+        live_key, staged_key = getattr(table, key), staging.c[key]
+        inserted = session.execute(
+            insert(table).from_select(
+                [key, *columns, 'last_updated'],
+                select(staged_key, *[staging.c[column] for column in columns], literal(now, DateTime))
+                .where(~exists().where(live_key == staged_key)),
+            )
+        ).rowcount
+        updated = session.execute(
+            update(table)
+            .where(live_key == staged_key)
+            .where(or_(*[getattr(table, column).is_distinct_from(staging.c[column]) for column in columns]))
+            .values({**{column: staging.c[column] for column in columns}, 'last_updated': now})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        return {'inserted': inserted, 'updated': updated}
+
+    def _delete_missing(self, session, table, staging, key, keep):
+        """Delete live rows that are no longer present in staging, except those in the kept scope"""
+        statement = delete(table).where(~exists().where(staging.c[key] == getattr(table, key)))
+        kept = keep(table)
+        if kept is not None:
+            statement = statement.where(~kept)
+        return session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+    def _load_read_models(self):
+        try:
+            self.refresh_read_models()
+        finally:
+            self.read_models_loaded.set()
+
+    def refresh_read_models(self):
+        """Rebuild the read snapshot, when enabled, and the CIDR index from the published tables"""
+        if READ_SNAPSHOT:
+            self.refresh_snapshot()
+        self.refresh_cidr_index()
+
+    def refresh_snapshot(self):
+        """Rebuild the read snapshot from the published tables and swap it in"""
+        started = time.perf_counter()
+        try:
+            Session = self.storage.ReadSession
+            with Session() as session:
+                # one read transaction, so the snapshot matches a single generation
+                generation = session.execute(
+                    select(Generation.generation, Generation.published_at).where(Generation.id == 1)
+                ).first()
+                vpc_rows = session.execute(
+                    select(
+                        VPC.vpc_id, VPC.account_id, VPC.region, VPC.name, VPC.cidr_block, VPC.state,
+                        VPC.utilization_score, VPC.last_updated, UtilizationTrend.days_to_exhaustion,
+                    )
+                    .outerjoin(UtilizationTrend, UtilizationTrend.entity_id == VPC.vpc_id)
+                    .order_by(VPC.vpc_id)
+                ).all()
+                subnet_rows = session.execute(
+                    select(
+                        Subnet.vpc_id, Subnet.subnet_id, Subnet.name, Subnet.cidr_block,
+                        Subnet.availability_zone, Subnet.state, Subnet.available_ip_count,
+                        Subnet.total_ip_count, Subnet.utilization_score, UtilizationTrend.days_to_exhaustion,
+                        *[getattr(Subnet, column) for column in IP_SPACE_COLUMNS],
+                    )
+                    .outerjoin(UtilizationTrend, UtilizationTrend.entity_id == Subnet.subnet_id)
+                    .order_by(Subnet.vpc_id, Subnet.subnet_id)
+                ).all()
+                grades = {
+                    row.vpc_id: dict(row._mapping)
+                    for row in session.execute(
+                        select(*Grade.__table__.columns, VPC.name).join(VPC, VPC.vpc_id == Grade.vpc_id)
+                    )
+                }
+            snapshot = ReadSnapshot(
+                generation.generation if generation else 0,
+                generation.published_at if generation else None,
+                vpc_rows, subnet_rows, grades,
+            )
+        except Exception as e:
+            # keep serving the previous snapshot rather than failing reads
+            logger.error(f"Failed to build read snapshot: {e}")
+            return self.snapshot
+
+        # a slow build must not replace a newer snapshot
+        with self._snapshot_lock:
+            if self.snapshot is None or snapshot.generation >= self.snapshot.generation:
+                self.snapshot = snapshot
+        logger.info(
+            f"Built read snapshot of generation {snapshot.generation}: {len(vpc_rows)} VPCs, "
+            f"{len(subnet_rows)} subnets in {time.perf_counter() - started:.2f}s"
+        )
+        return self.snapshot
+
+    def refresh_cidr_index(self):
+        """Rebuild the CIDR overlap index from the published tables and swap it in"""
+        started = time.perf_counter()
+        try:
+            Session = self.storage.ReadSession
+            with Session() as session:
+                generation = session.execute(
+                    select(Generation.generation, Generation.published_at).where(Generation.id == 1)
+                ).first()
+                vpc_rows = [
+                    dict(row._mapping) for row in session.execute(
+                        select(VPC.vpc_id, VPC.account_id, VPC.region, VPC.cidr_block)
+                    )
+                ]
+                subnet_rows = [
+                    dict(row._mapping) for row in session.execute(
+                        select(Subnet.subnet_id, Subnet.vpc_id, Subnet.account_id, Subnet.region, Subnet.cidr_block)
+                    )
+                ]
+            index = CidrIndex(
+                generation.generation if generation else 0,
+                generation.published_at if generation else None,
+                vpc_rows, subnet_rows,
+            )
+        except Exception as e:
+            logger.error(f"Failed to build CIDR index: {e}")
+            return self.cidr_index
+
+        with self._snapshot_lock:
+            if self.cidr_index is None or index.generation >= self.cidr_index.generation:
+                self.cidr_index = index
+        logger.info(
+            f"Built CIDR index of generation {index.generation}: {index.overlap_count('vpc')} VPC and "
+            f"{index.overlap_count('subnet')} subnet overlaps in {time.perf_counter() - started:.2f}s"
+        )
+        return self.cidr_index
+
+    def current_generation(self):
+        """Return the generation number of the last published refresh"""
+        return self.current_version()[0]
+
+    def last_refreshed(self):
+        """Return when a refresh last published or confirmed the data, or None"""
+        Session = self.storage.ReadSession
+        with Session() as session:
+            return session.scalar(
+                select(func.coalesce(Generation.refreshed_at, Generation.published_at)).where(Generation.id == 1)
+            )
+
+    def current_version(self):
+        """Return (generation, published_at) of the last published refresh"""
+        Session = self.storage.ReadSession
+        with Session() as session:
+            row = session.execute(
+                select(Generation.generation, Generation.published_at).where(Generation.id == 1)
+            ).first()
+            return (row.generation, row.published_at) if row else (0, None)
+
+    @staticmethod
+    def _tag_name(resource):
+        """Return the Name tag of an AWS resource"""
+        for tag in resource.get('Tags', []):
+            if tag.get('Key') == 'Name':
+                return tag.get('Value', 'unknown')
+        return 'unknown'
+
+    def _vpc_row(self, vpc, region):
+        """Map a describe_vpcs item to a VPC row"""
+        return {
+            'vpc_id': vpc['VpcId'],
+            'account_id': int(vpc.get('OwnerId', 0)),
+            'name': self._tag_name(vpc),
+            'cidr_block': vpc['CidrBlock'],
+            'state': vpc['State'],
+            'region': region,
+            'utilization_score': 0,
+        }
+
+    def _subnet_row(self, subnet, region):
+        """Map a describe_subnets item to a Subnet row with its utilization score"""
+        total_ips = 2**(32 - int(subnet['CidrBlock'].split('/')[1]))
+        # AWS reserves five addresses per subnet that can never be assigned
+        usable_ips = max(total_ips - RESERVED_IPS, 0)
+        used_ips = usable_ips - subnet['AvailableIpAddressCount']
+        utilization_score = round((used_ips / usable_ips) * 100, 2) if usable_ips > 0 else 0
+        return {
+            'subnet_id': subnet['SubnetId'],
+            'vpc_id': subnet['VpcId'],
+            'account_id': int(subnet.get('OwnerId', 0)),
+            'name': self._tag_name(subnet),
+            'cidr_block': subnet['CidrBlock'],
+            'state': subnet['State'],
+            'region': region,
+            'availability_zone': subnet['AvailabilityZone'],
+            'available_ip_count': subnet['AvailableIpAddressCount'],
+            'total_ip_count': total_ips,
+            'utilization_score': utilization_score,
+        }
     
-    def update_db(self):
+    def update_db(self, scope: RefreshScope = None, progress=None):
+        """Incrementally refresh the database, or one scope of it, from AWS and report row counts"""
         logger.info("Starting database update...")
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-        
+        started = time.perf_counter()
         try:
-            # Clear existing data
-            subnet_count = session.query(Subnet).count()
-            vpc_count = session.query(VPC).count()
-            logger.info(f"Clearing {subnet_count} subnets and {vpc_count} VPCs from database")
-            
-            session.query(Subnet).delete()
-            session.query(VPC).delete()
-            session.commit()
-            session.close()
-            
-            # Reseed with fresh data
-            logger.info("Reseeding database with fresh AWS data...")
-            self.seed_db()
+            counts = self.seed_db(scope, progress)
+            record_refresh(time.perf_counter() - started, 'success', counts)
             logger.info("Database update completed successfully")
-            
+            return counts
         except Exception as e:
-            session.rollback()
+            record_refresh(time.perf_counter() - started, 'error')
             logger.error(f"Failed to update database: {e}")
             raise
-        finally:
-            if session:
-                session.close()
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+Immutable in-memory copy of the published inventory for serving reads without
+touching the database. Built after every publish and swapped in as a whole,
+so a reader holding a snapshot always sees one consistent generation.
+"""
+
+from model.grading import GRADE_BOUNDS, scores_to_grades
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import numpy as np
+import os
+import sys
+
+READ_SNAPSHOT = os.getenv("READ_SNAPSHOT", "false").lower() in ("1", "true", "yes")
+
+# Column order of the rows a snapshot is built from
+SNAPSHOT_VPC_COLUMNS = (
+    "vpc_id", "account_id", "region", "name", "cidr_block", "state",
+    "utilization_score", "last_updated", "days_to_exhaustion",
+)
+SNAPSHOT_SUBNET_COLUMNS = (
+    "vpc_id", "subnet_id", "name", "cidr_block", "availability_zone", "state",
+    "available_ip_count", "total_ip_count", "utilization_score", "days_to_exhaustion",
+    "used_ip_count", "largest_free_block", "free_prefix_blocks", "fragmentation_score",
+)
+
+
+class ReadSnapshot:
+    """
+    Column lists for VPCs (sorted by vpc_id) and subnets (sorted by vpc_id,
+    subnet_id), each VPC's range of subnet rows, presorted keysets for every
+    sort order and the materialized grades. Nothing is mutated after __init__.
+    """
+
+    def __init__(self, generation: int, published_at, vpc_rows, subnet_rows, grades: dict):
+        self.generation = generation
+        self.published_at = published_at
+        self.grades = grades
+
+        vpcs = self._columns(vpc_rows, SNAPSHOT_VPC_COLUMNS)
+        self.vpc_ids = vpcs["vpc_id"]
+        self.vpc_index = {vpc_id: row for row, vpc_id in enumerate(self.vpc_ids)}
+        scores = np.array([np.nan if score is None else score for score in vpcs["utilization_score"]], dtype=float)
+        self.account_ids = np.array(vpcs["account_id"], dtype=np.int64)
+        self.states = np.array(vpcs["state"], dtype=object)
+        self.utilization_scores = scores
+        self.vpc_days = vpcs["days_to_exhaustion"]
+        self.last_updated = vpcs["last_updated"]
+
+        # list responses are the same for every request, so they are built once
+        vpc_grades = scores_to_grades(np.nan_to_num(scores)).tolist() if len(scores) else []
+        self.vpc_summaries = [
+            {
+                'vpc_id': vpc_id,
+                'account_id': account_id,
+                'region': region,
+                'name': name,
+                'cidr_block': cidr_block,
+                'state': state,
+                'utilization_score': score,
+                'grade': grade,
+                'last_updated': last_updated.isoformat() if last_updated else None,
+            }
+            for vpc_id, account_id, region, name, cidr_block, state, score, grade, last_updated in zip(
+                self.vpc_ids, vpcs["account_id"], vpcs["region"], vpcs["name"], vpcs["cidr_block"],
+                vpcs["state"], vpcs["utilization_score"], vpc_grades, vpcs["last_updated"],
+            )
+        ]
+
+        # (value, vpc_id) keysets in ascending order and the VPC rows they point to
+        self.keysets = {}
+        self.orders = {}
+        for sort, values in (
+            ('vpc_id', self.vpc_ids),
+            ('utilization', vpcs["utilization_score"]),
+            ('last_updated', [value or datetime.min for value in vpcs["last_updated"]]),
+        ):
+            order = sorted(range(len(values)), key=lambda row: (values[row], self.vpc_ids[row]))
+            self.keysets[sort] = [(values[row], self.vpc_ids[row]) for row in order]
+            self.orders[sort] = np.array(order, dtype=np.int64)
+
+        subnets = self._columns(subnet_rows, SNAPSHOT_SUBNET_COLUMNS)
+        self.subnets = subnets
+        subnet_scores = [score or 0 for score in subnets["utilization_score"]]
+        self.subnet_grades = scores_to_grades(subnet_scores).tolist() if subnet_scores else []
+        # subnets of VPC row i are rows subnet_start[i]:subnet_start[i + 1]
+        subnet_vpc_ids = np.array(subnets["vpc_id"], dtype=object)
+        self.subnet_start = np.searchsorted(subnet_vpc_ids, np.array(self.vpc_ids + [chr(0x10FFFF)], dtype=object)).tolist()
+
+    @staticmethod
+    def _columns(rows, names) -> dict:
+        """Transpose rows into one list per column, sharing repeated strings"""
+        columns = {name: list(values) for name, values in zip(names, zip(*rows))} if rows else {}
+        for name in names:
+            columns.setdefault(name, [])
+        for name in ("state", "region", "availability_zone"):
+            if name in columns:
+                columns[name] = [sys.intern(value) if isinstance(value, str) else value for value in columns[name]]
+        return columns
+
+    def page_vpcs(self, limit: int, position=None, sort: str = 'vpc_id', order: str = 'asc', account_id=None,
+                  state=None, grades=None, min_utilization=None, max_utilization=None):
+        """
+        One page of VPC summaries after the (value, vpc_id) keyset position,
+        matching the SQL path. Returns the page and the (value, vpc_id) of its
+        last row when another page follows, else None.
+        """
+        keyset = self.keysets[sort]
+        ordered = self.orders[sort]
+        if order == 'asc':
+            start = bisect_right(keyset, position) if position is not None else 0
+            candidates = ordered[start:]
+        else:
+            stop = bisect_left(keyset, position) if position is not None else len(keyset)
+            candidates = ordered[:stop][::-1]
+
+        mask = self._filter(account_id, state, grades, min_utilization, max_utilization)
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        rows = candidates[:limit + 1].tolist()
+
+        last = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = (self._keyset_value(sort, rows[-1]), self.vpc_ids[rows[-1]])
+        return [self.vpc_summaries[row] for row in rows], last
+
+    def _keyset_value(self, sort: str, row: int):
+        if sort == 'utilization':
+            return self.vpc_summaries[row]['utilization_score']
+        if sort == 'last_updated':
+            return self.last_updated[row]
+        return self.vpc_ids[row]
+
+    def _filter(self, account_id, state, grades, min_utilization, max_utilization):
+        """Boolean mask over VPC rows, or None when nothing is filtered"""
+        mask = None
+
+        def both(condition):
+            return condition if mask is None else mask & condition
+
+        scores = self.utilization_scores
+        if account_id is not None:
+            mask = both(self.account_ids == account_id)
+        if state is not None:
+            mask = both(self.states == state)
+        if grades is not None:
+            in_grade = np.zeros(len(scores), dtype=bool)
+            for grade in grades:
+                low, high = GRADE_BOUNDS[grade]
+                condition = scores >= low if low is not None else ~np.isnan(scores)
+                if high is not None:
+                    condition &= scores < high
+                in_grade |= condition
+            mask = both(in_grade)
+        if min_utilization is not None:
+            mask = both(scores >= min_utilization)
+        if max_utilization is not None:
+            mask = both(scores <= max_utilization)
+        return mask
+
+    def vpc_details(self, vpc_id: str):
+        """A VPC with its subnets, or None"""
+        row = self.vpc_index.get(vpc_id)
+        if row is None:
+            return None
+        subnets = self.subnets
+        details = []
+        for index in range(self.subnet_start[row], self.subnet_start[row + 1]):
+            details.append({
+                'subnet_id': subnets["subnet_id"][index],
+                'name': subnets["name"][index],
+                'cidr_block': subnets["cidr_block"][index],
+                'availability_zone': subnets["availability_zone"][index],
+                'state': subnets["state"][index],
+                'available_ip_count': subnets["available_ip_count"][index],
+                'total_ip_count': subnets["total_ip_count"][index],
+                'utilization_score': subnets["utilization_score"][index],
+                'grade': self.subnet_grades[index],
+                'days_to_exhaustion': subnets["days_to_exhaustion"][index],
+                'used_ip_count': subnets["used_ip_count"][index],
+                'largest_free_block': subnets["largest_free_block"][index],
+                'free_prefix_blocks': subnets["free_prefix_blocks"][index],
+                'fragmentation_score': subnets["fragmentation_score"][index],
+            })
+        summary = self.vpc_summaries[row]
+        return {
+            **{key: value for key, value in summary.items() if key != 'last_updated'},
+            'days_to_exhaustion': self.vpc_days[row],
+            'last_updated': summary['last_updated'],
+            'subnets': details,
+        }
+
+    def grade(self, vpc_id: str):
+        """The materialized grade row of a VPC including its name, or None"""
+        return self.grades.get(vpc_id)
@@ -0,0 +1,246 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format. Kept
+dependency free and cheap enough to leave on: an observation is a bisect and
+an addition under a per-metric lock.
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+# Upper bounds in seconds, from a fast SQLite lookup to a slow multi-account refresh
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Queries issued by a single HTTP request
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values, key=lambda item: tuple(map(str, item[0]))):
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; with a function it is read at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list[str]:
+        if self.function is not None:
+            self.set(self.function())
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Bucketed observations with their count and sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (the last one is +Inf), then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the seconds spent inside it"""
+        return _Timer(self, labels)
+
+    def _samples(self, key, value) -> list[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            bucket = _format_labels(self.labels, key, (("le", _format_value(bound)),))
+            lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    """Named metrics rendered together; registering a name again replaces it"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+AWS_CALL_SECONDS = REGISTRY.register(Histogram(
+    "aws_api_call_seconds", "Latency of AWS API calls, one per page", ("operation", "region")))
+AWS_CALL_ERRORS = REGISTRY.register(Counter(
+    "aws_api_call_errors_total", "AWS API calls that raised", ("operation", "region")))
+AWS_THROTTLES = REGISTRY.register(Counter(
+    "aws_api_throttles_total", "AWS API calls rejected by rate limiting", ("operation", "region")))
+AWS_RETRIES = REGISTRY.register(Counter(
+    "aws_api_retries_total", "AWS API calls retried after throttling or transient errors", ("operation", "region")))
+AWS_RATE_LIMIT = REGISTRY.register(Gauge(
+    "aws_api_rate_limit", "Current adaptive request rate per account/region bucket", ("bucket",)))
+SQL_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "sql_query_seconds", "Duration of every SQL statement"))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_seconds", "Duration of HTTP requests", ("endpoint", "status")))
+HTTP_REQUEST_QUERIES = REGISTRY.register(Histogram(
+    "http_request_sql_queries", "SQL statements issued per HTTP request", ("endpoint",), QUERY_COUNT_BUCKETS))
+HTTP_REQUEST_SQL_SECONDS = REGISTRY.register(Histogram(
+    "http_request_sql_seconds", "Time spent in SQL per HTTP request", ("endpoint",)))
+JSON_SERIALIZE_SECONDS = REGISTRY.register(Histogram(
+    "json_serialize_seconds", "Time spent serializing response bodies", ("endpoint",)))
+REFRESH_SECONDS = REGISTRY.register(Histogram(
+    "refresh_seconds", "Duration of inventory refreshes", ("outcome",)))
+REFRESH_ROWS_CHANGED = REGISTRY.register(Counter(
+    "refresh_rows_changed_total", "Rows changed by inventory refreshes", ("table", "change")))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "startup_seconds", "Seconds from the start of the app module to each startup phase", ("phase",)))
+
+# SQL work of the request being served on this thread
+_request = threading.local()
+
+
+def start_request() -> None:
+    _request.queries = 0
+    _request.sql_seconds = 0.0
+    _request.started = time.perf_counter()
+
+
+def finish_request(endpoint: str, status: int) -> None:
+    """Record the duration and SQL work of the request started on this thread"""
+    started = getattr(_request, "started", None)
+    if started is None:
+        return
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=status)
+    HTTP_REQUEST_QUERIES.observe(_request.queries, endpoint=endpoint)
+    HTTP_REQUEST_SQL_SECONDS.observe(_request.sql_seconds, endpoint=endpoint)
+    _request.started = None
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement the engine runs and attribute it to the current request"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(connection, cursor, statement, parameters, context, executemany):
+        _finish_query(connection)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _finish_query(exception_context.connection)
+
+
+def _finish_query(connection) -> None:
+    started = connection.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    SQL_QUERY_SECONDS.observe(elapsed)
+    if getattr(_request, "started", None) is not None:
+        _request.queries += 1
+        _request.sql_seconds += elapsed
+
+
+def record_refresh(seconds: float, outcome: str, counts: dict = None) -> None:
+    """Record a refresh and the rows it inserted, updated or deleted per table"""
+    REFRESH_SECONDS.observe(seconds, outcome=outcome)
+    for table in ("vpcs", "subnets"):
+        for change, rows in (counts or {}).get(table, {}).items():
+            if rows:
+                REFRESH_ROWS_CHANGED.inc(rows, table=table, change=change)
@@ -0,0 +1,41 @@
+"""
+Shared fixtures. Tests run against an in-memory database and stub EC2
+clients backed by bench.inventory, so they need neither AWS nor LocalStack.
+"""
+
+from pathlib import Path
+import sys
+
+# modules are imported from src the way app.py imports them
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aws.collector import InventoryCollector, Target
+from bench.inventory import SyntheticInventory
+from db.storage import Storage
+from model.model import modelConfig
+import pytest
+
+
+@pytest.fixture
+def east():
+    return SyntheticInventory(6, 3, account=111122223333, region="us-east-1")
+
+
+@pytest.fixture
+def west():
+    return SyntheticInventory(4, 2, account=444455556666, region="us-west-2")
+
+
+@pytest.fixture
+def make_model():
+    """Build a model over a fresh in-memory database collecting from targets"""
+    storages = []
+
+    def make(*targets: Target) -> modelConfig:
+        storage = Storage("sqlite://")
+        storages.append(storage)
+        return modelConfig(InventoryCollector(list(targets)), storage=storage, warm_start=False)
+
+    yield make
+    for storage in storages:
+        storage.dispose()
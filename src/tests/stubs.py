@@ -0,0 +1,19 @@
+"""Stub EC2 clients and targets for tests"""
+
+from aws.collector import Target
+from bench.inventory import StubEC2Client, SyntheticInventory
+
+
+class FailingClient:
+    """An EC2 client whose every describe call fails"""
+
+    def __init__(self, message: str = "access denied"):
+        self.message = message
+
+    def get_paginator(self, operation: str):
+        raise RuntimeError(self.message)
+
+
+def stub_target(inventory: SyntheticInventory) -> Target:
+    """A target collecting from inventory through the stub client"""
+    return Target(region=inventory.region, client=StubEC2Client(inventory))
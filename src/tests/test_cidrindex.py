@@ -0,0 +1,134 @@
+"""CIDR overlap and containment index, checked against ipaddress"""
+
+from model.cidrindex import CidrIndex
+import ipaddress
+import itertools
+import random
+import pytest
+
+
+def vpc(vpc_id: str, cidr_block: str, account_id: int = 111122223333) -> dict:
+    return {"vpc_id": vpc_id, "account_id": account_id, "region": "us-east-1", "cidr_block": cidr_block}
+
+
+def index_of(*vpcs: dict) -> CidrIndex:
+    return CidrIndex(1, None, list(vpcs), [])
+
+
+def overlapping_pairs(index: CidrIndex) -> set:
+    pairs = index.overlaps("vpc", 0, index.overlap_count("vpc") + 1)
+    return {frozenset(resource["vpc_id"] for resource in pair["resources"]) for pair in pairs}
+
+
+def brute_force_pairs(vpcs) -> set:
+    return {
+        frozenset((a["vpc_id"], b["vpc_id"]))
+        for a, b in itertools.combinations(vpcs, 2)
+        if ipaddress.IPv4Network(a["cidr_block"]).overlaps(ipaddress.IPv4Network(b["cidr_block"]))
+    }
+
+
+def brute_force_containing(vpcs, ip: str) -> list:
+    """VPCs holding ip, most specific first"""
+    holding = [row for row in vpcs if ipaddress.IPv4Address(ip) in ipaddress.IPv4Network(row["cidr_block"])]
+    return sorted(holding, key=lambda row: -ipaddress.IPv4Network(row["cidr_block"]).prefixlen)
+
+
+CASES = {
+    "nested": [vpc("vpc-a", "10.0.0.0/8"), vpc("vpc-b", "10.1.0.0/16"), vpc("vpc-c", "10.1.2.0/24")],
+    "identical": [vpc("vpc-a", "10.0.0.0/16"), vpc("vpc-b", "10.0.0.0/16"), vpc("vpc-c", "10.0.0.0/16")],
+    "adjacent": [vpc("vpc-a", "10.0.0.0/16"), vpc("vpc-b", "10.1.0.0/16"), vpc("vpc-c", "10.2.0.0/15")],
+    "cross_account": [
+        vpc("vpc-a", "172.16.0.0/12", account_id=1),
+        vpc("vpc-b", "172.16.5.0/24", account_id=2),
+        vpc("vpc-c", "172.31.255.0/24", account_id=3),
+        vpc("vpc-d", "192.168.0.0/16", account_id=2),
+    ],
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_overlaps_match_brute_force(case):
+    vpcs = CASES[case]
+    index = index_of(*vpcs)
+
+    assert overlapping_pairs(index) == brute_force_pairs(vpcs)
+    assert index.overlap_count("vpc") == len(brute_force_pairs(vpcs))
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_lookups_match_brute_force(case):
+    vpcs = CASES[case]
+    index = index_of(*vpcs)
+    # the first, last and one-past-the-end address of every block
+    ips = set()
+    for row in vpcs:
+        network = ipaddress.IPv4Network(row["cidr_block"])
+        ips.update((network[0], network[-1], network[-1] + 1, network[0] - 1))
+
+    for ip in map(str, ips):
+        expected = brute_force_containing(vpcs, ip)
+        found = index.lookup(ip)["vpcs"]
+        # identical blocks may come in any order, but the specificity order holds
+        assert sorted(row["vpc_id"] for row in found) == sorted(row["vpc_id"] for row in expected)
+        assert [row["cidr_block"] for row in found] == [row["cidr_block"] for row in expected]
+
+
+def test_overlap_pairs_are_outer_then_inner():
+    index = index_of(*CASES["nested"])
+
+    for pair in index.overlaps("vpc", 0, 10):
+        outer, inner = pair["resources"]
+        assert ipaddress.IPv4Network(inner["cidr_block"]).subnet_of(ipaddress.IPv4Network(outer["cidr_block"]))
+        assert pair["overlap"] == inner["cidr_block"]
+
+
+def test_overlaps_page_through_every_pair_once():
+    vpcs = CASES["identical"] + [vpc("vpc-d", "10.0.128.0/17"), vpc("vpc-e", "10.0.0.0/8")]
+    index = index_of(*vpcs)
+
+    pages = [index.overlaps("vpc", offset, 2) for offset in range(0, index.overlap_count("vpc"), 2)]
+    pairs = [frozenset(row["vpc_id"] for row in pair["resources"]) for page in pages for pair in page]
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == brute_force_pairs(vpcs)
+    assert index.overlaps("vpc", index.overlap_count("vpc"), 2) == []
+
+
+def test_empty_index():
+    index = CidrIndex(0, None, [], [])
+
+    for kind in ("vpc", "subnet"):
+        assert index.overlap_count(kind) == 0
+        assert index.overlaps(kind, 0, 10) == []
+    assert index.lookup("10.0.0.1") == {"ip": "10.0.0.1", "vpcs": [], "subnets": []}
+
+
+def test_random_blocks_match_brute_force():
+    rng = random.Random(11)
+    vpcs = []
+    for number in range(300):
+        prefix = rng.randint(12, 28)
+        network = ipaddress.IPv4Network((rng.randrange(10 << 24, 11 << 24), prefix), strict=False)
+        vpcs.append(vpc(f"vpc-{number}", str(network), account_id=rng.randint(1, 3)))
+    index = index_of(*vpcs)
+
+    assert overlapping_pairs(index) == brute_force_pairs(vpcs)
+    for _ in range(200):
+        ip = str(ipaddress.IPv4Address(rng.randrange(10 << 24, 11 << 24)))
+        assert sorted(row["vpc_id"] for row in index.lookup(ip)["vpcs"]) == sorted(
+            row["vpc_id"] for row in brute_force_containing(vpcs, ip)
+        )
+
+
+def test_subnets_of_different_vpcs_overlap():
+    subnets = [
+        {"subnet_id": "subnet-a", "vpc_id": "vpc-a", "cidr_block": "10.0.1.0/24"},
+        {"subnet_id": "subnet-b", "vpc_id": "vpc-b", "cidr_block": "10.0.1.128/25"},
+        {"subnet_id": "subnet-c", "vpc_id": "vpc-b", "cidr_block": "10.0.2.0/24"},
+    ]
+    index = CidrIndex(1, None, [], subnets)
+
+    (pair,) = index.overlaps("subnet", 0, 10)
+    assert [row["subnet_id"] for row in pair["resources"]] == ["subnet-a", "subnet-b"]
+    assert [row["subnet_id"] for row in index.lookup("10.0.1.200")["subnets"]] == ["subnet-b", "subnet-a"]
+    assert index.lookup("10.0.1.200")["vpcs"] == []
@@ -0,0 +1,105 @@
+"""Multi-target collection: per-target failure isolation and resources seen by several targets"""
+
+from aws.collector import DEFAULT_REGION, Target
+from bench.inventory import SyntheticInventory
+from model.model import Subnet, VPC, migrate_schema
+from sqlalchemy import func, select, update
+from stubs import FailingClient, stub_target
+import pytest
+
+
+def vpc_rows(model) -> dict:
+    with model.storage.ReadSession() as session:
+        return dict(session.execute(select(VPC.vpc_id, VPC.region)).all())
+
+
+def count(model, table) -> int:
+    with model.storage.ReadSession() as session:
+        return session.scalar(select(func.count()).select_from(table))
+
+
+def test_refresh_collects_every_target(make_model, east, west):
+    model = make_model(stub_target(east), stub_target(west))
+
+    counts = model.seed_db()
+
+    assert counts['vpcs']['inserted'] == east.vpcs + west.vpcs
+    assert counts['subnets']['inserted'] == east.vpcs * east.subnets_per_vpc + west.vpcs * west.subnets_per_vpc
+    assert counts['failed_targets'] == {}
+    assert set(vpc_rows(model).values()) == {"us-east-1", "us-west-2"}
+
+
+def test_failing_target_keeps_its_rows_and_others_publish(make_model, east, west):
+    model = make_model(stub_target(east), stub_target(west))
+    model.seed_db()
+    before = vpc_rows(model)
+
+    # west fails and east drops a VPC
+    east.vpcs -= 1
+    model.client.targets = [stub_target(east), Target(region=west.region, client=FailingClient())]
+    counts = model.seed_db()
+
+    assert counts['failed_targets'] == {"default/us-west-2": "access denied"}
+    assert counts['vpcs']['deleted'] == 1
+    after = vpc_rows(model)
+    assert set(before) - set(after) == {east.vpc_id(east.vpcs)}
+    assert [vpc for vpc, region in after.items() if region == "us-west-2"] == [
+        vpc for vpc, region in before.items() if region == "us-west-2"
+    ]
+
+
+def test_every_target_failing_aborts_without_publishing(make_model, east, west):
+    model = make_model(stub_target(east), stub_target(west))
+    model.seed_db()
+    generation = model.current_generation()
+
+    model.client.targets = [Target(region=region, client=FailingClient()) for region in ("us-east-1", "us-west-2")]
+    with pytest.raises(RuntimeError, match="failed for every target"):
+        model.seed_db()
+
+    assert model.current_generation() == generation
+    assert count(model, VPC) == east.vpcs + west.vpcs
+
+
+def test_resource_listed_by_two_targets_is_staged_once(make_model, east):
+    # two targets reaching the same account, as with overlapping AWS_TARGETS or shared VPCs
+    model = make_model(stub_target(east), stub_target(east))
+
+    counts = model.seed_db()
+
+    assert counts['vpcs']['inserted'] == east.vpcs
+    assert count(model, VPC) == east.vpcs
+    assert count(model, Subnet) == east.vpcs * east.subnets_per_vpc
+
+
+def test_unchanged_refresh_keeps_the_generation(make_model, east):
+    model = make_model(stub_target(east))
+    model.seed_db()
+    generation = model.current_generation()
+
+    counts = model.seed_db()
+
+    assert counts['changed'] is False
+    assert model.current_generation() == generation
+
+
+def test_rows_from_before_regions_belong_to_the_default_target(make_model):
+    legacy = SyntheticInventory(5, 2, account=777788889999, region=DEFAULT_REGION)
+    model = make_model(stub_target(legacy))
+    model.seed_db()
+    # as published by the single-region schema, then migrated
+    with model.storage.WriteSession() as session:
+        for table in (VPC, Subnet):
+            session.execute(update(table).values(region=None))
+        session.commit()
+    migrate_schema(model.engine)
+    assert set(vpc_rows(model).values()) == {DEFAULT_REGION}
+
+    # the default target's first collection after the migration fails
+    other = SyntheticInventory(2, 1, account=444455556666, region="eu-west-1")
+    model.client.targets = [Target(region=DEFAULT_REGION, client=FailingClient()), stub_target(other)]
+    counts = model.seed_db()
+
+    assert counts['vpcs']['deleted'] == 0
+    assert count(model, VPC) == legacy.vpcs + other.vpcs
+    assert count(model, Subnet) == legacy.vpcs * legacy.subnets_per_vpc + other.vpcs * other.subnets_per_vpc
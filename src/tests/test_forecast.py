@@ -0,0 +1,116 @@
+"""Exponentially weighted exhaustion trends"""
+
+from model.forecast import FORECAST_HALF_LIFE_DAYS, FORECAST_SAMPLE_INTERVAL, TREND_COLUMNS, update_trends
+from model.model import VPC, UtilizationTrend
+from sqlalchemy import select, update
+from stubs import stub_target
+import math
+import numpy as np
+import pytest
+
+DAY = 86400
+
+
+def fold(series, start: int = 1_700_000_000, interval: int = DAY) -> dict:
+    """Feed one entity's samples, taken interval seconds apart, through update_trends"""
+    state = {column: np.zeros(1) for column in TREND_COLUMNS}
+    for number, value in enumerate(series):
+        state = update_trends(state, start + number * interval, [value])
+    return state
+
+
+def days(state) -> float:
+    return state["days_to_exhaustion"][0]
+
+
+def test_rising_utilization_projects_exhaustion():
+    # one point a day from 50%, so 59% after ten days with 41 to go
+    state = fold([50 + day for day in range(10)])
+
+    assert state["slope"][0] == pytest.approx(1.0)
+    assert days(state) == pytest.approx(41.0)
+
+
+def test_exhausted_subnet_has_no_days_left():
+    assert days(fold([96, 98, 100, 102])) == 0
+
+
+@pytest.mark.parametrize("series", [[40] * 10, [60 - day for day in range(10)], [40, 40.0000001, 40]])
+def test_flat_or_falling_utilization_has_no_exhaustion_date(series):
+    state = fold(series)
+
+    assert math.isnan(days(state))
+    assert state["slope"][0] <= 1e-6
+
+
+def test_too_few_samples_are_not_trusted():
+    assert math.isnan(days(fold([10, 20])))
+    assert not math.isnan(days(fold([10, 20, 30])))
+
+
+def test_running_moments_match_weighted_least_squares():
+    rng = np.random.default_rng(3)
+    t = np.cumsum(rng.uniform(0.2, 3, 40))
+    y = 20 + 0.8 * t + rng.normal(0, 2, t.size)
+    state = {column: np.zeros(1) for column in TREND_COLUMNS}
+    for ts, value in zip(t, y):
+        state = update_trends(state, 1_700_000_000 + ts * DAY, [value])
+
+    weights = 0.5 ** ((t[-1] - t) / FORECAST_HALF_LIFE_DAYS)
+    slope, intercept = np.polyfit(t, y, 1, w=np.sqrt(weights))
+    assert state["slope"][0] == pytest.approx(slope, abs=1e-4)
+    assert days(state) == pytest.approx((100 - (intercept + slope * t[-1])) / slope, abs=0.1)
+
+
+def test_older_samples_lose_weight():
+    # a long flat stretch then growth; the trend leans further into the growth than an equal-weight fit
+    series = [30] * 60 + [30 + 2 * day for day in range(1, 15)]
+    state = fold(series)
+
+    unweighted = np.polyfit(np.arange(len(series)), series, 1)[0]
+    assert state["slope"][0] > 1.5 * unweighted > 0
+
+
+@pytest.fixture
+def model(make_model, east):
+    model = make_model(stub_target(east))
+    with model.storage.WriteSession() as session:
+        session.add(VPC(
+            vpc_id="vpc-trend", account_id=1, name="trend", cidr_block="10.0.0.0/16", state="available",
+            utilization_score=50,
+        ))
+        session.commit()
+    return model
+
+
+def sample(model, ts: int, score: float) -> int:
+    with model.storage.WriteSession() as session:
+        session.execute(update(VPC).where(VPC.vpc_id == "vpc-trend").values(utilization_score=score))
+        updated = model._update_trends(session, ts)
+        session.commit()
+    return updated
+
+
+def stored(model) -> UtilizationTrend:
+    with model.storage.ReadSession() as session:
+        return session.scalar(select(UtilizationTrend).where(UtilizationTrend.entity_id == "vpc-trend"))
+
+
+def test_samples_closer_than_the_interval_are_skipped(model):
+    start = 1_700_000_000
+    assert sample(model, start, 50) == 1
+    assert sample(model, start + FORECAST_SAMPLE_INTERVAL - 1, 90) == 0
+    assert stored(model).samples == 1
+    assert sample(model, start + FORECAST_SAMPLE_INTERVAL, 51) == 1
+    assert stored(model).samples == 2
+
+
+def test_stored_trend_has_no_exhaustion_date_unless_rising(model):
+    start = 1_700_000_000
+    for day, score in enumerate((50, 51, 52, 53)):
+        sample(model, start + day * DAY, score)
+    assert stored(model).days_to_exhaustion == pytest.approx(47, abs=0.1)
+
+    for day, score in enumerate((40, 30, 20, 10, 5), start=4):
+        sample(model, start + day * DAY, score)
+    assert stored(model).days_to_exhaustion is None
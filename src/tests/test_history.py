@@ -0,0 +1,121 @@
+"""Change-point history and its hourly and daily rollups"""
+
+from controller.controller import controllerConfig
+from model.history import DAILY, HOURLY, RAW, aggregate
+from model.model import VPC, UtilizationHistory
+from sqlalchemy import func, select, update
+from stubs import stub_target
+import pytest
+import random
+import time
+
+# three days ago at midnight, inside every resolution's retention
+ORIGIN = (int(time.time()) // DAILY - 3) * DAILY
+SAMPLE = 1800
+
+
+@pytest.fixture
+def model(make_model, east):
+    model = make_model(stub_target(east))
+    with model.storage.WriteSession() as session:
+        session.add(VPC(
+            vpc_id="vpc-tracked", account_id=1, name="tracked", cidr_block="10.0.0.0/16", state="available",
+            utilization_score=0,
+        ))
+        session.commit()
+    return model
+
+
+def record(model, ts: int, score: float) -> None:
+    """Set the tracked VPC's utilization and record history as a refresh at ts would"""
+    with model.storage.WriteSession() as session:
+        session.execute(update(VPC).where(VPC.vpc_id == "vpc-tracked").values(utilization_score=score))
+        model._record_history(session, ts)
+        session.commit()
+
+
+def raw_points(model, start: int, end: int, step: int) -> list:
+    """The same window aggregated straight from the raw change points"""
+    with model.storage.ReadSession() as session:
+        rows = model._history_rows(session, "vpc-tracked", RAW, start, end)
+    return [(bucket, *(value / 100 for value in values)) for bucket, *values in aggregate(rows, start, end, step)]
+
+
+@pytest.fixture
+def recorded(model):
+    """Two and a half days of half-hourly samples; values repeat, so only some become change points"""
+    rng = random.Random(5)
+    last = ORIGIN + 5 * DAILY // 2
+    for ts in range(ORIGIN, last, SAMPLE):
+        # even hundredths keep every hourly average exact
+        record(model, ts, rng.choice((10, 10, 24.5, 37.02, 80)))
+    return model, last
+
+
+def test_raw_history_stores_change_points_only(recorded):
+    model, last = recorded
+    with model.storage.ReadSession() as session:
+        stored = session.scalar(
+            select(func.count()).select_from(UtilizationHistory)
+            .where(UtilizationHistory.entity_id == "vpc-tracked", UtilizationHistory.resolution == RAW)
+        )
+    assert 0 < stored < (last - ORIGIN) // SAMPLE
+
+
+@pytest.mark.parametrize("step, resolution", [(HOURLY, HOURLY), (DAILY, DAILY)])
+def test_rollups_match_raw_aggregation(recorded, step, resolution):
+    model, last = recorded
+    # the window ends inside a bucket that is still open
+    end = last - SAMPLE + 600
+
+    used, _, points = model.get_history("vpc-tracked", ORIGIN, end, step)
+
+    assert used == resolution
+    assert points == raw_points(model, ORIGIN, end, step)
+    assert points[-1][0] == (end - ORIGIN) // step * step + ORIGIN
+
+
+def test_rollups_match_raw_aggregation_at_a_finer_step(recorded):
+    model, last = recorded
+
+    used, _, points = model.get_history("vpc-tracked", ORIGIN + HOURLY, last, 4 * HOURLY)
+
+    assert used == HOURLY
+    assert points == raw_points(model, ORIGIN + HOURLY, last, 4 * HOURLY)
+
+
+def test_open_bucket_is_read_from_raw_points(recorded):
+    model, last = recorded
+    # a change inside the hour after the watermark shows before any rollup covers it
+    record(model, last + 60, 99)
+
+    _, _, points = model.get_history("vpc-tracked", ORIGIN, last + HOURLY, HOURLY)
+
+    assert points == raw_points(model, ORIGIN, last + HOURLY, HOURLY)
+    assert points[-1][3] == 99
+
+
+def test_vpc_without_change_points_has_empty_history(recorded):
+    model, last = recorded
+    # published after the last refresh recorded history
+    with model.storage.WriteSession() as session:
+        session.add(VPC(vpc_id="vpc-quiet", account_id=1, name="quiet", cidr_block="10.1.0.0/16", state="available"))
+        session.commit()
+
+    assert model.get_history("vpc-quiet", ORIGIN, last, HOURLY)[2] == []
+    history = controllerConfig(model).get_vpc_history("vpc-quiet", start=str(ORIGIN), end=str(last), step="3600")
+    assert history["points"] == []
+    assert controllerConfig(model).get_vpc_history("vpc-missing") is None
+
+
+def test_aggregate_weights_values_by_time_and_carries_the_value_before_start():
+    rows = [(0, 1000, 1000, 1000), (150, 2000, 1500, 2500), (300, 4000, 4000, 4000)]
+
+    assert aggregate(rows, 100, 400, 100) == [
+        (100, 1500, 1000, 2500),
+        (200, 2000, 1500, 2500),
+        (300, 4000, 4000, 4000),
+    ]
+    # nothing recorded before the first change point
+    assert aggregate(rows[1:], 0, 200, 100) == [(100, 2000, 1500, 2500)]
+    assert aggregate([], 0, 200, 100) == []
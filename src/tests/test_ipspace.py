@@ -0,0 +1,157 @@
+"""Subnet address-space analysis from network interface addresses"""
+
+from model.ipspace import IpUsage, _to_ints, parse_cidrs
+import ipaddress
+import logging
+import random
+
+
+def interface(subnet_id: str, *addresses: str, prefixes=()) -> dict:
+    return {
+        "SubnetId": subnet_id,
+        "PrivateIpAddresses": [{"PrivateIpAddress": address} for address in addresses],
+        "Ipv4Prefixes": [{"Ipv4Prefix": prefix} for prefix in prefixes],
+    }
+
+
+def analyze(subnets: dict, *pages) -> dict:
+    """Analyze subnets {id: cidr} after adding each page of interfaces; one dict of columns per subnet"""
+    usage = IpUsage()
+    for page in pages:
+        usage.add(page)
+    columns = usage.analyze(list(subnets), list(subnets.values()))
+    return {
+        subnet_id: {column: values[row].item() for column, values in columns.items()}
+        for row, subnet_id in enumerate(subnets)
+    }
+
+
+def brute_force(cidr: str, addresses) -> dict:
+    """The same columns from a set of taken offsets and a walk over the subnet"""
+    network = ipaddress.IPv4Network(cidr)
+    size = network.num_addresses
+    used = {int(ipaddress.IPv4Address(address)) - int(network.network_address) for address in addresses}
+    used = {offset for offset in used if 0 <= offset < size}
+    taken = used | {0, 1, 2, 3, size - 1}
+    runs, run = [], 0
+    for offset in range(size):
+        if offset in taken:
+            runs.append(run)
+            run = 0
+        else:
+            run += 1
+    largest = max(runs + [run])
+    free = size - len(taken)
+    return {
+        "used_ip_count": len(used - {0, 1, 2, 3, size - 1}),
+        "largest_free_block": largest,
+        "free_prefix_blocks": sum(
+            not any(block <= offset < block + 16 for offset in taken) for block in range(0, size - size % 16, 16)
+        ),
+        "fragmentation_score": round(100 * (free - largest) / free, 2) if free else 0.0,
+    }
+
+
+def test_empty_subnet_has_only_its_reserved_addresses_taken():
+    result = analyze({"subnet-a": "10.0.0.0/24"})["subnet-a"]
+
+    # .4 to .254 are free; the first and last /28 hold reserved addresses
+    assert result == {
+        "used_ip_count": 0, "largest_free_block": 251, "free_prefix_blocks": 14, "fragmentation_score": 0.0,
+    }
+
+
+def test_full_subnet_has_no_free_space():
+    addresses = [f"10.0.0.{offset}" for offset in range(4, 15)]
+    result = analyze({"subnet-a": "10.0.0.0/28"}, [interface("subnet-a", *addresses)])["subnet-a"]
+
+    assert result == {
+        "used_ip_count": 11, "largest_free_block": 0, "free_prefix_blocks": 0, "fragmentation_score": 0.0,
+    }
+
+
+def test_reserved_broadcast_and_outside_addresses_are_not_counted_as_used():
+    addresses = ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.255", "10.0.1.9", "10.0.0.4"]
+    result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-a", *addresses)])["subnet-a"]
+
+    assert result["used_ip_count"] == 1
+    assert result["largest_free_block"] == 250
+    assert result == brute_force("10.0.0.0/24", addresses)
+
+
+def test_single_hole():
+    addresses = [f"10.0.0.{offset}" for offset in range(4, 255) if offset != 100]
+    result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-a", *addresses)])["subnet-a"]
+
+    assert result == {
+        "used_ip_count": 250, "largest_free_block": 1, "free_prefix_blocks": 0, "fragmentation_score": 0.0,
+    }
+
+
+def test_free_space_outside_the_largest_block_is_fragmentation():
+    addresses = [f"10.0.0.{offset}" for offset in range(4, 255) if not 50 <= offset < 60 and offset != 100]
+    result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-a", *addresses)])["subnet-a"]
+
+    assert result["largest_free_block"] == 10
+    assert result["fragmentation_score"] == round(100 / 11, 2)
+
+
+def test_interleaved_interfaces_across_subnets_and_pages():
+    subnets = {"subnet-a": "10.0.0.0/24", "subnet-b": "10.0.1.0/25", "subnet-c": "10.0.2.0/28"}
+    rng = random.Random(7)
+    pages, expected = [], {subnet_id: [] for subnet_id in subnets}
+    for _ in range(5):
+        page = []
+        for _ in range(40):
+            subnet_id = rng.choice(list(subnets))
+            network = ipaddress.IPv4Network(subnets[subnet_id])
+            # addresses are out of order and may repeat across interfaces
+            addresses = [str(network[rng.randrange(network.num_addresses)]) for _ in range(rng.randint(0, 3))]
+            expected[subnet_id].extend(addresses)
+            page.append(interface(subnet_id, *addresses))
+        pages.append(page)
+
+    result = analyze(subnets, *pages)
+
+    assert result == {subnet_id: brute_force(subnets[subnet_id], expected[subnet_id]) for subnet_id in subnets}
+
+
+def test_delegated_prefixes_take_every_address_in_them():
+    result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-a", prefixes=["10.0.0.16/28"])])["subnet-a"]
+
+    assert result["used_ip_count"] == 16
+    assert result == brute_force("10.0.0.0/24", [f"10.0.0.{offset}" for offset in range(16, 32)])
+
+
+def test_unknown_subnets_are_ignored():
+    result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-z", "10.0.0.10")])
+
+    assert result["subnet-a"]["used_ip_count"] == 0
+
+
+def test_malformed_addresses_are_skipped(caplog):
+    addresses = ["10.0.0.10", "10.0.0", "10.0.0.300", "ten.0.0.1", "10.0.0.11"]
+    with caplog.at_level(logging.WARNING):
+        result = analyze({"subnet-a": "10.0.0.0/24"}, [interface("subnet-a", *addresses)])["subnet-a"]
+
+    assert result["used_ip_count"] == 2
+    assert "Skipped 3 malformed interface addresses" in caplog.text
+
+
+def test_to_ints_marks_malformed_addresses():
+    assert _to_ints(["10.0.0.1", "10.0.0", "255.255.255.255", "1.2.3.4.5"]).tolist() == [
+        167772161, -1, 4294967295, -1,
+    ]
+
+
+def test_parse_cidrs_rejects_malformed_blocks():
+    networks, sizes = parse_cidrs(["10.1.0.0/16", "0.0.0.0/0"])
+    assert networks.tolist() == [167837696, 0]
+    assert sizes.tolist() == [65536, 2**32]
+    for cidr in ("10.0.0.0/33", "10.0.0.0", "10.0.0/24"):
+        try:
+            parse_cidrs([cidr])
+        except ValueError as e:
+            assert cidr in str(e)
+        else:
+            raise AssertionError(f"{cidr} was accepted")
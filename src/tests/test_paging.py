@@ -0,0 +1,93 @@
+"""Keyset paging of GET /vpc from the database and from the read snapshot"""
+
+from controller.controller import SORT_COLUMNS, controllerConfig
+from model.model import VPC
+from sqlalchemy import select, update
+from stubs import stub_target
+from view.view import viewConfig
+from datetime import datetime, timedelta
+import base64
+import json
+import pytest
+
+
+@pytest.fixture
+def controller(make_model, east):
+    east.vpcs = 23
+    model = make_model(stub_target(east))
+    model.seed_db()
+    # few distinct scores and timestamps, so most rows tie on the sort value
+    with model.storage.WriteSession() as session:
+        vpc_ids = session.scalars(select(VPC.vpc_id).order_by(VPC.vpc_id)).all()
+        for number, vpc_id in enumerate(vpc_ids):
+            session.execute(
+                update(VPC).where(VPC.vpc_id == vpc_id).values(
+                    utilization_score=(12.5, 40, 40, 87.25)[number % 4],
+                    last_updated=datetime(2026, 1, 1) + timedelta(hours=number % 3),
+                )
+            )
+        session.commit()
+    model.snapshot = None
+    return controllerConfig(model)
+
+
+def pages(controller, **params) -> list:
+    """Every page of GET /vpc for params, following next_cursor"""
+    result, cursor = [], None
+    while True:
+        vpcs, cursor = controller.get_all_vpcs(limit=4, cursor=cursor, **params)
+        result.append(vpcs)
+        if cursor is None:
+            return result
+
+
+def sort_key(sort: str):
+    column = SORT_COLUMNS[sort].key
+    return lambda vpc: (vpc[column], vpc['vpc_id'])
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort", list(SORT_COLUMNS))
+@pytest.mark.parametrize("filters", [{}, {"min_utilization": "40"}, {"grade": "A,F"}])
+def test_pages_cover_every_vpc_once_in_both_read_paths(controller, sort, order, filters):
+    from_sql = pages(controller, sort=sort, order=order, **filters)
+    controller.model.refresh_snapshot()
+    from_snapshot = pages(controller, sort=sort, order=order, **filters)
+    controller.model.snapshot = None
+
+    assert from_snapshot == from_sql
+    listed = [vpc for page in from_sql for vpc in page]
+    everything, _ = controller.get_all_vpcs(limit=1000, **filters)
+    assert len({vpc['vpc_id'] for vpc in listed}) == len(listed)
+    assert sorted(listed, key=sort_key(sort), reverse=order == 'desc') == listed
+    assert {vpc['vpc_id'] for vpc in listed} == {vpc['vpc_id'] for vpc in everything}
+    assert all(len(page) == 4 for page in from_sql[:-1])
+
+
+def cursor_of(value, vpc_id="vpc-000000") -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, vpc_id]).encode()).decode()
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+@pytest.mark.parametrize("sort, value", [
+    ("vpc_id", 12.5),
+    ("utilization", "vpc-000000"),
+    ("utilization", True),
+    ("last_updated", 40),
+])
+def test_cursor_of_another_sort_is_rejected(controller, snapshot, sort, value):
+    if snapshot:
+        controller.model.refresh_snapshot()
+    client = viewConfig(controller).app.test_client()
+
+    response = client.get("/vpc", query_string={"sort": sort, "cursor": cursor_of(value)})
+
+    assert response.status_code == 400
+    assert "invalid cursor" in response.get_json()["error"]
+
+
+def test_malformed_cursor_is_rejected(controller):
+    client = viewConfig(controller).app.test_client()
+
+    assert client.get("/vpc", query_string={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/vpc", query_string={"cursor": cursor_of("vpc-1", vpc_id=7)}).status_code == 400
@@ -0,0 +1,187 @@
+"""Throttling-aware EC2 client: retries, backoff and the adaptive token bucket"""
+
+from aws import throttle
+from aws.throttle import (
+    MIN_RATE_SHARE, SUCCESS_INCREASE, THROTTLE_COOLDOWN, ThrottledClient, TokenBucket,
+)
+from bench.inventory import SyntheticInventory, ThrottlingStubClient
+from botocore.exceptions import ClientError, ConnectionError
+import math
+import pytest
+
+
+def throttling_error(operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": "RequestLimitExceeded", "Message": "Request limit exceeded."}}, operation)
+
+
+class ScriptedClient:
+    """Answers each call with the next scripted error, then with a response"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _answer(self, operation: str) -> dict:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"operation": operation}
+
+    def describe_vpcs(self, **kwargs) -> dict:
+        return self._answer("describe_vpcs")
+
+    def create_vpc(self, **kwargs) -> dict:
+        return self._answer("create_vpc")
+
+
+class FakeClock:
+    """Stands in for the time module so buckets and backoff never really sleep"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    attempts = []
+    monkeypatch.setattr(throttle, "backoff", lambda attempt: attempts.append(attempt) or 0.0)
+    return attempts
+
+
+def test_throttled_describe_is_retried_and_lowers_the_rate(clock, backoffs):
+    client = ScriptedClient(throttling_error("DescribeVpcs"), throttling_error("DescribeVpcs"))
+    bucket = TokenBucket(rate=20, burst=100)
+
+    response = ThrottledClient(client, bucket, "us-east-1").describe_vpcs()
+
+    assert response == {"operation": "describe_vpcs"}
+    assert client.calls == 3
+    assert backoffs == [1, 2]
+    # both throttles fell within one cooldown, so the rate halved once before the success
+    assert bucket.rate == pytest.approx(10 + 20 * SUCCESS_INCREASE)
+
+
+def test_transient_describe_errors_are_retried(clock, backoffs):
+    client = ScriptedClient(ConnectionError(error="reset"), ClientError({"Error": {"Code": "Unavailable"}}, "DescribeVpcs"))
+
+    ThrottledClient(client, TokenBucket(rate=20), "us-east-1").describe_vpcs()
+
+    assert client.calls == 3
+
+
+def test_retries_stop_at_max_retries(clock, backoffs):
+    client = ScriptedClient(*[throttling_error("DescribeVpcs") for _ in range(5)])
+
+    with pytest.raises(ClientError):
+        ThrottledClient(client, TokenBucket(rate=20), "us-east-1", max_retries=2).describe_vpcs()
+
+    assert client.calls == 3
+
+
+def test_other_errors_are_not_retried(clock, backoffs):
+    client = ScriptedClient(ClientError({"Error": {"Code": "InvalidVpcID.NotFound"}}, "DescribeVpcs"))
+
+    with pytest.raises(ClientError):
+        ThrottledClient(client, TokenBucket(rate=20), "us-east-1").describe_vpcs()
+
+    assert client.calls == 1
+
+
+def test_throttled_mutating_calls_are_retried(clock, backoffs):
+    client = ScriptedClient(throttling_error("CreateVpc"), throttling_error("CreateVpc"))
+    bucket = TokenBucket(rate=20)
+
+    response = ThrottledClient(client, bucket, "us-east-1").create_vpc(CidrBlock="10.0.0.0/16")
+
+    assert response == {"operation": "create_vpc"}
+    assert client.calls == 3
+    assert bucket.rate < 20
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionError(error="reset"),
+    ClientError({"Error": {"Code": "InternalError"}}, "CreateVpc"),
+])
+def test_mutating_calls_that_may_have_run_are_not_retried(clock, backoffs, error):
+    client = ScriptedClient(error)
+
+    with pytest.raises(type(error)):
+        ThrottledClient(client, TokenBucket(rate=20), "us-east-1").create_vpc(CidrBlock="10.0.0.0/16")
+
+    assert client.calls == 1
+    assert backoffs == []
+
+
+def test_rate_halves_once_per_cooldown_down_to_the_floor(clock):
+    bucket = TokenBucket(rate=20, burst=100)
+
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate == 10
+
+    clock.now += THROTTLE_COOLDOWN
+    bucket.throttled()
+    assert bucket.rate == 5
+
+    for _ in range(20):
+        clock.now += THROTTLE_COOLDOWN
+        bucket.throttled()
+    assert bucket.rate == 20 * MIN_RATE_SHARE
+
+
+def test_rate_recovers_additively_to_the_ceiling(clock):
+    bucket = TokenBucket(rate=20, burst=100)
+    bucket.throttled()
+
+    successes = math.ceil((20 - 10) / (20 * SUCCESS_INCREASE))
+    for _ in range(successes - 1):
+        bucket.succeeded()
+    assert 10 < bucket.rate < 20
+
+    bucket.succeeded()
+    bucket.succeeded()
+    assert bucket.rate == 20
+
+
+def test_acquire_waits_for_a_token(clock):
+    bucket = TokenBucket(rate=10, burst=1)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.1)
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket(rate=0, burst=0)
+
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    bucket.throttled()
+    assert bucket.rate == 0
+
+
+def test_paginator_completes_a_listing_through_throttles(monkeypatch):
+    # real time: the stub refills 500 tokens/s and each retry waits 5ms
+    monkeypatch.setattr(throttle, "backoff", lambda attempt: 0.005)
+    inventory = SyntheticInventory(40, 1)
+    stub = ThrottlingStubClient(inventory, rate=500, burst=2)
+    client = ThrottledClient(stub, TokenBucket(rate=1000, burst=1000), "us-east-1")
+
+    pages = list(client.get_paginator("describe_vpcs").paginate(PaginationConfig={"PageSize": 4}))
+
+    assert [vpc["VpcId"] for page in pages for vpc in page["Vpcs"]] == [vpc["VpcId"] for vpc in inventory.iter_vpcs()]
+    assert stub.throttled > 0
+    assert "NextToken" not in pages[-1]
@@ -0,0 +1,85 @@
+"""Response caching of read endpoints across published generations"""
+
+from controller import controller as controller_module
+from controller.controller import controllerConfig
+from stubs import stub_target
+from view.view import viewConfig
+from datetime import datetime, timedelta, timezone
+import pytest
+
+
+@pytest.fixture
+def published(make_model, east):
+    model = make_model(stub_target(east))
+    model.seed_db()
+    return model, viewConfig(controllerConfig(model)).app.test_client()
+
+
+def test_lookup_is_tagged_with_the_index_generation_until_it_is_rebuilt(published, east, monkeypatch):
+    model, client = published
+    ip = f"10.{east.vpcs}.0.7"
+    first = client.get("/cidr/lookup", query_string={"ip": ip})
+    assert first.get_json()["lookup"]["vpcs"] == []
+
+    # publish a new VPC without rebuilding the index, as between publish and the index swap
+    monkeypatch.setattr(model, "refresh_read_models", lambda: None)
+    east.vpcs += 1
+    assert model.seed_db()["changed"]
+    assert model.current_generation() == model.cidr_index.generation + 1
+
+    stale = client.get("/cidr/lookup", query_string={"ip": ip})
+    assert stale.get_json()["lookup"]["vpcs"] == []
+    assert stale.headers["ETag"] == first.headers["ETag"]
+
+    model.refresh_cidr_index()
+    fresh = client.get("/cidr/lookup", query_string={"ip": ip}, headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    assert [vpc["vpc_id"] for vpc in fresh.get_json()["lookup"]["vpcs"]] == [east.vpc_id(east.vpcs - 1)]
+
+
+def test_overlaps_follow_the_index_generation(published, east, monkeypatch):
+    model, client = published
+    first = client.get("/overlaps", query_string={"kind": "subnet"})
+
+    monkeypatch.setattr(model, "refresh_read_models", lambda: None)
+    east.vpcs += 1
+    model.seed_db()
+
+    assert client.get("/overlaps", query_string={"kind": "subnet"}).headers["ETag"] == first.headers["ETag"]
+    model.refresh_cidr_index()
+    assert client.get("/overlaps", query_string={"kind": "subnet"}).headers["ETag"] != first.headers["ETag"]
+
+
+def test_history_without_an_end_follows_the_clock(published, monkeypatch):
+    model, client = published
+    vpc_id = client.get("/vpc").get_json()["vpcs"][0]["vpc_id"]
+    now = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(controller_module, "datetime", Clock)
+    first = client.get(f"/vpc/{vpc_id}/history")
+    now += timedelta(minutes=5)
+    second = client.get(f"/vpc/{vpc_id}/history")
+
+    assert first.status_code == second.status_code == 200
+    assert "ETag" not in second.headers
+    assert second.get_json()["history"]["to"] == now.isoformat()
+    assert first.get_json()["history"]["to"] != second.get_json()["history"]["to"]
+
+
+def test_history_with_an_end_is_cached(published):
+    model, client = published
+    vpc_id = client.get("/vpc").get_json()["vpcs"][0]["vpc_id"]
+
+    first = client.get(f"/vpc/{vpc_id}/history", query_string={"to": "2026-10-17T12:00:00"})
+    second = client.get(
+        f"/vpc/{vpc_id}/history", query_string={"to": "2026-10-17T12:00:00"},
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+
+    assert second.status_code == 304
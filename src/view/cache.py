@@ -0,0 +1,60 @@
+"""
+Response cache for read endpoints, keyed by route, parameters and the
+published data generation
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+
+class ResponseCache:
+    """Bounded LRU of built responses that empties itself when the generation changes"""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(key: tuple, generation: int) -> str:
+        """Entity tag for a cache key; responses only change when the generation does"""
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return f"{generation}-{digest}"
+
+    def get(self, key: tuple, generation: int):
+        with self._lock:
+            if not self._invalidate(generation):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, generation: int, entry) -> None:
+        with self._lock:
+            if not self._invalidate(generation):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _invalidate(self, generation: int) -> bool:
+        """Drop everything on a newer generation; returns False for a superseded one"""
+        if self.generation is not None and generation < self.generation:
+            return False
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+        return True
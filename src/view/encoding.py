@@ -0,0 +1,106 @@
+"""
+Response encodings for the read endpoints: orjson for JSON, MessagePack as a
+compact binary alternative, and gzip or brotli compression above a size
+threshold. Encoded bytes are kept on the cached entry, so a repeat request
+for the same representation skips encoding and compression entirely.
+"""
+
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+import gzip
+import msgpack
+import numpy as np
+import orjson
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Media types clients may ask for and the format each is served as
+MEDIA_TYPES = {JSON: JSON, MSGPACK: MSGPACK, "application/x-msgpack": MSGPACK}
+# Content codings in order of preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# sorted keys keep the key order of Flask's default provider
+ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """Types neither encoder handles natively"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def encode_json(body) -> bytes:
+    return orjson.dumps(body, default=_default, option=ORJSON_OPTIONS)
+
+
+def encode_msgpack(body) -> bytes:
+    return msgpack.packb(body, default=_default, datetime=False)
+
+
+ENCODERS = {JSON: encode_json, MSGPACK: encode_msgpack}
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def negotiate(request) -> tuple[str, str]:
+    """The (media type, content coding or None) to answer a request with"""
+    accepted = request.accept_mimetypes.best_match(list(MEDIA_TYPES), default=JSON)
+    encoding = next((name for name in ENCODINGS if name in request.accept_encodings), None)
+    return MEDIA_TYPES[accepted], encoding
+
+
+class EncodedResponse:
+    """A built (body, status) with its encoded representations, filled in as they are requested"""
+
+    def __init__(self, body, status: int):
+        self.body = body
+        self.status = status
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, media_type: str, encoding: str = None) -> tuple[bytes, str, bool]:
+        """
+        Bytes of one representation, the content coding actually applied
+        (None below COMPRESS_MIN_BYTES) and whether they had to be encoded
+        """
+        variant = self._variants.get((media_type, encoding))
+        if variant is not None:
+            return variant + (False,)
+        data = ENCODERS[media_type](self.body)
+        applied = encoding if encoding and len(data) >= COMPRESS_MIN_BYTES else None
+        if applied:
+            data = compress(data, applied)
+        with self._lock:
+            self._variants[(media_type, encoding)] = (data, applied)
+        return data, applied, True
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for the responses outside the cached path"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return encode_json(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
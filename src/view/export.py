@@ -0,0 +1,69 @@
+"""
+NDJSON encoding of the subnet export, shared by GET /export/subnets and the
+command line:
+
+    python -m view.export --output subnets.ndjson.gz --gzip
+"""
+
+from controller.controller import EXPORT_CHUNK_ROWS
+import argparse
+import json
+import logging
+import sys
+import zlib
+
+
+def ndjson_chunks(rows, compress: bool = False, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Encode rows as newline-delimited JSON, yielding bytes after the first row
+    and then every chunk_rows rows so clients see data immediately. With
+    compress the stream is gzip, sync-flushed at every chunk.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    count = 0
+    for row in rows:
+        buffer.append(json.dumps(row, separators=(",", ":")))
+        count += 1
+        if count == 1 or len(buffer) >= chunk_rows:
+            yield _encode(buffer, compressor, zlib.Z_SYNC_FLUSH)
+            buffer = []
+    if buffer or compressor:
+        yield _encode(buffer, compressor, zlib.Z_FINISH)
+
+
+def _encode(lines: list[str], compressor, flush_mode: int) -> bytes:
+    data = "".join(line + "\n" for line in lines).encode()
+    if compressor is None:
+        return data
+    return compressor.compress(data) + compressor.flush(flush_mode)
+
+
+def main(argv=None) -> int:
+    from aws.collector import InventoryCollector, ec2_client, parse_targets
+    from controller.controller import controllerConfig
+    from model.model import modelConfig
+
+    parser = argparse.ArgumentParser(description="Export every subnet with its VPC and grade as NDJSON")
+    parser.add_argument("--output", help="file to write, defaults to stdout")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--account-id", help="only export subnets of this account")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    # the collector builds AWS clients lazily, so exporting never calls AWS
+    model = modelConfig(InventoryCollector(parse_targets(), client_factory=ec2_client))
+    rows = controllerConfig(model).export_subnets(account_id=args.account_id)
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in ndjson_chunks(rows, compress=args.gzip):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
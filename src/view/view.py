@@ -4,14 +4,49 @@ is collected by the model component but these data aren’t taken directly but t
 the controller. It only interacts with the controller.
 """
 
-from flask import Flask
+from flask import Flask, Response, request
 from controller.controller import controllerConfig
+from telemetry import metrics
+from view.cache import ResponseCache
+from view.encoding import EncodedResponse, OrjsonProvider, negotiate
+from view.export import ndjson_chunks
+import time
+
+# Query parameters accepted by GET /vpc
+VPC_QUERY_PARAMS = (
+    "limit",
+    "cursor",
+    "account_id",
+    "state",
+    "grade",
+    "min_utilization",
+    "max_utilization",
+    "sort",
+    "order",
+)
 
 
 class viewConfig:
     def __init__(self, controller: controllerConfig):
         self.app = Flask(__name__)
+        self.app.json = OrjsonProvider(self.app)
         self.controller = controller
+        self.cache = ResponseCache()
+        self._register_cache_metrics()
+
+        @self.app.before_request
+        def start_request_metrics():
+            metrics.start_request()
+
+        @self.app.after_request
+        def finish_request_metrics(response):
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.finish_request(endpoint, response.status_code)
+            return response
+
+        @self.app.route("/metrics")
+        def get_metrics():
+            return metrics.REGISTRY.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
 
         @self.app.route("/")
         def healthcheck():
@@ -19,34 +54,193 @@ class viewConfig:
                 "status": "healthy",
                 "service": "AWS VPC Health and Utilization Metric API",
                 "version": "1.0.0",
+                "refresh": self.controller.refresh_status(),
             }
         
+        @self.app.route("/refresh", methods=["POST"])
+        def start_refresh():
+            body = request.get_json(silent=True)
+            if body is None:
+                body = {}
+            elif not isinstance(body, dict):
+                return {"error": "JSON body must be an object"}, 400
+            params = {**request.args.to_dict(), **body}
+            try:
+                job, created = self.controller.start_refresh(
+                    account_id=params.get("account_id"), vpc_id=params.get("vpc_id")
+                )
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            return {"job": job, "created": created}, 202, {"Location": f"/refresh/{job['job_id']}"}
+
+        @self.app.route("/refresh/<job_id>")
+        def get_refresh_job(job_id):
+            # jobs change while the data generation does not, so never cached
+            job = self.controller.refresh_job(job_id)
+            if job:
+                return {"job": job}, 200
+            return {"error": f"Refresh job {job_id} not found"}, 404
+
         @self.app.route("/vpc")
         def get_all_vpcs():
-            try:
-                vpcs = self.controller.get_all_vpcs()
-                return {"vpcs": vpcs, "count": len(vpcs)}, 200
-            except Exception as e:
-                return {"error": str(e)}, 500
+            def build():
+                vpcs, next_cursor = self.controller.get_all_vpcs(
+                    **{
+                        param: request.args[param]
+                        for param in VPC_QUERY_PARAMS
+                        if param in request.args
+                    }
+                )
+                return {"vpcs": vpcs, "count": len(vpcs), "next_cursor": next_cursor}, 200
+
+            return self.cached_response(build)
         
         @self.app.route("/vpc/<vpc_id>")
         def get_vpc_by_id(vpc_id):
-            try:
+            def build():
                 vpc = self.controller.get_vpc_details(vpc_id)
                 if vpc:
                     return {"vpc": vpc}, 200
                 else:
                     return {"error": f"VPC {vpc_id} not found"}, 404
-            except Exception as e:
-                return {"error": str(e)}, 500
+
+            return self.cached_response(build)
         
         @self.app.route("/vpc/<vpc_id>/grade")
         def grade_vpc(vpc_id):
-            try:
+            def build():
                 grade = self.controller.grade_vpc(vpc_id)
                 if grade:
                     return {"grade": grade}, 200
                 else:
                     return {"error": f"VPC {vpc_id} not found"}, 404
-            except Exception as e:
-                return {"error": str(e)}, 500
+
+            return self.cached_response(build)
+
+        @self.app.route("/vpc/<vpc_id>/history")
+        def get_vpc_history(vpc_id):
+            def build():
+                history = self.controller.get_vpc_history(
+                    vpc_id,
+                    start=request.args.get("from"),
+                    end=request.args.get("to"),
+                    step=request.args.get("step"),
+                )
+                if history:
+                    return {"history": history}, 200
+                else:
+                    return {"error": f"VPC {vpc_id} not found"}, 404
+
+            # without an end the window follows the clock, not the generation
+            return self.cached_response(build, cacheable="to" in request.args)
+
+        @self.app.route("/grades")
+        def get_all_grades():
+            def build():
+                grades = self.controller.get_all_grades()
+                return {"grades": grades, "count": len(grades)}, 200
+
+            return self.cached_response(build)
+
+        @self.app.route("/overlaps")
+        def get_overlaps():
+            def build():
+                overlaps, total, next_cursor = self.controller.get_overlaps(
+                    kind=request.args.get("kind", "vpc"),
+                    limit=request.args.get("limit"),
+                    cursor=request.args.get("cursor"),
+                )
+                return {"overlaps": overlaps, "count": len(overlaps), "total": total, "next_cursor": next_cursor}, 200
+
+            return self.cached_response(build, self.controller.cidr_version)
+
+        @self.app.route("/cidr/lookup")
+        def lookup_cidr():
+            def build():
+                return {"lookup": self.controller.lookup_cidr(request.args.get("ip"))}, 200
+
+            return self.cached_response(build, self.controller.cidr_version)
+
+        @self.app.route("/export/subnets")
+        def export_subnets():
+            # streamed straight from the database, so never cached
+            try:
+                rows = self.controller.export_subnets(account_id=request.args.get("account_id"))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            compress = "gzip" in request.accept_encodings
+            response = Response(ndjson_chunks(rows, compress), mimetype="application/x-ndjson")
+            response.vary.add("Accept-Encoding")
+            if compress:
+                response.headers["Content-Encoding"] = "gzip"
+            return response
+
+    def cached_response(self, build, version=None, cacheable=True):
+        """
+        Serve a read endpoint from the response cache for the current data
+        generation in the negotiated format and compression, answering
+        conditional requests with 304 Not Modified. version returns the
+        (generation, published_at) the endpoint reads from, when that is not
+        the published data itself. A response that is not cacheable, because
+        it depends on more than the generation, is built on every request.
+        """
+        if not cacheable:
+            return self.fresh_response(build)
+        try:
+            # a read model swapped in during build only files newer data under the older tag
+            generation, published_at = (version or self.controller.data_version)()
+            media_type, encoding = negotiate(request)
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            # each representation has its own tag
+            etag = self.cache.etag(key + (media_type, encoding), generation)
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                entry = self.cache.get(key, generation)
+                if entry is None:
+                    entry = EncodedResponse(*build())
+                    self.cache.put(key, generation, entry)
+                started = time.perf_counter()
+                data, applied, fresh = entry.encoded(media_type, encoding)
+                if fresh:
+                    metrics.JSON_SERIALIZE_SECONDS.observe(time.perf_counter() - started, endpoint=request.url_rule.rule)
+                response = Response(data, entry.status, mimetype=media_type)
+                if applied:
+                    response.headers["Content-Encoding"] = applied
+            response.vary.update(("Accept", "Accept-Encoding"))
+            response.set_etag(etag)
+            if published_at:
+                response.last_modified = published_at
+            return response.make_conditional(request)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        except Exception as e:
+            return {"error": str(e)}, 500
+
+    def fresh_response(self, build):
+        """Serve a read endpoint built for this request in the negotiated format and compression, untagged"""
+        try:
+            media_type, encoding = negotiate(request)
+            entry = EncodedResponse(*build())
+            data, applied, _ = entry.encoded(media_type, encoding)
+            response = Response(data, entry.status, mimetype=media_type)
+            if applied:
+                response.headers["Content-Encoding"] = applied
+            response.vary.update(("Accept", "Accept-Encoding"))
+            response.cache_control.no_cache = True
+            return response
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        except Exception as e:
+            return {"error": str(e)}, 500
+
+    def _register_cache_metrics(self):
+        """Expose the response cache counters, read at scrape time"""
+        metrics.REGISTRY.register(metrics.Gauge(
+            "response_cache_hits", "Response cache hits since start", function=lambda: self.cache.hits))
+        metrics.REGISTRY.register(metrics.Gauge(
+            "response_cache_misses", "Response cache misses since start", function=lambda: self.cache.misses))
+        metrics.REGISTRY.register(metrics.Gauge(
+            "response_cache_hit_ratio", "Share of cacheable requests served from the cache",
+            function=lambda: self.cache.hits / max(self.cache.hits + self.cache.misses, 1)))